@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from logic.document import ScoredDocument
+from logic.token_array import Vocabulary
+from logic.tokenizer import Tokenizer
+from logic.worker import DEFAULT_TOKENS_PATH
+from utils import configure_logging
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_EXAMPLES_PATH = os.path.join(PROJECT_DIR, 'ejemplos', 'examples.json')
+
+
+class CorpusGenerator:
+    """
+    Synthesizes conversations from the lines of examples.json and the words of tokens.json.
+    Each line is either a real example line (so the performance criteria still match) or a line of
+    words drawn from a Zipf distribution over the vocabulary, where unknown_rate of the vocabulary
+    are made-up words outside the lexicon.
+    """
+
+    def __init__(self, examples_path=DEFAULT_EXAMPLES_PATH, tokens_path=DEFAULT_TOKENS_PATH,
+                 zipf_s=1.1, unknown_rate=0.2, example_line_rate=0.3, seed=0):
+        self.random = random.Random(seed)
+        with open(examples_path, 'r', encoding='utf-8') as file:
+            examples = json.load(file)
+        self.example_lines = [line for category in ('ATC', 'EXP') for item in examples[category] for line in item['conversation']]
+        with open(tokens_path, 'r', encoding='utf-8') as file:
+            tokens = json.load(file)
+        vocabulary = sorted({word for key in ('BUENAS', 'MALAS', 'NEUTRAS') for word in tokens[key]})
+        unknown_count = int(len(vocabulary) * unknown_rate / (1 - unknown_rate)) if unknown_rate < 1 else len(vocabulary)
+        vocabulary += [self._made_up_word() for _ in range(unknown_count)]
+        self.random.shuffle(vocabulary)
+        self.vocabulary = vocabulary
+        # Zipf: the word of rank r is drawn with weight 1 / r^s
+        self.cumulative_weights = []
+        total = 0.0
+        for rank in range(1, len(vocabulary) + 1):
+            total += 1.0 / rank ** zipf_s
+            self.cumulative_weights.append(total)
+        self.example_line_rate = example_line_rate
+
+    def _made_up_word(self):
+        return ''.join(self.random.choice('abcdefghijklmnopqrstuvwxyzáéíóúñ') for _ in range(self.random.randint(4, 10)))
+
+    def line(self, words_per_line=12):
+        if self.random.random() < self.example_line_rate:
+            return self.random.choice(self.example_lines)
+        words = self.random.choices(self.vocabulary, cum_weights=self.cumulative_weights, k=words_per_line)
+        return ' '.join(words).capitalize() + '.'
+
+    def conversation(self, lines=8, words_per_line=12):
+        return '\n'.join(self.line(words_per_line) for _ in range(lines)) + '\n'
+
+    def corpus(self, conversations, lines=8, words_per_line=12):
+        return [self.conversation(lines, words_per_line) for _ in range(conversations)]
+
+    def write_corpus(self, output_dir, conversations, lines=8, words_per_line=12):
+        # Same naming as Examples.generate_txt_files_from_json: ATC_000.txt, EXP_000.txt, ...
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for index in range(conversations):
+            category = 'ATC' if index % 2 == 0 else 'EXP'
+            path = os.path.join(output_dir, f"{category}_{index // 2:03d}.txt")
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(self.conversation(lines, words_per_line))
+            paths.append(path)
+        return paths
+
+
+def _stage_tokenize(tokenizer, corpus):
+    for text in corpus:
+        tokenizer.tokenize(text)
+
+
+def _stage_tokenized_batch(tokenizer, corpus):
+    # The whole corpus held in memory as lists of (token, normalized) tuples, so the peak memory covers all of it
+    batch = [tokenizer.tokenize(text) for text in corpus]  # noqa: F841
+
+
+def _stage_compact_batch(tokenizer, corpus):
+    # The whole corpus held in memory as TokenArrays sharing one Vocabulary
+    vocabulary = Vocabulary(tokenizer)
+    batch = [tokenizer.tokenize_compact(text, vocabulary) for text in corpus]  # noqa: F841
+
+
+def _stage_evaluate_experience(tokenizer, corpus):
+    for text in corpus:
+        tokenizer.evaluate_experience(text)
+
+
+def _stage_evaluate_performance(tokenizer, corpus):
+    for text in corpus:
+        tokenizer.evaluate_performance(text)
+
+
+def _stage_open_file(tokenizer, corpus):
+    # What the GUI does with an opened file: one ScoredDocument, which tokenizes the text once and
+    # finds the undefined words and the evaluation from those tokens
+    for text in corpus:
+        ScoredDocument(tokenizer, text)
+
+
+def _stage_report(tokenizer, corpus_dir):
+    # The GUI report starting from an empty result cache
+    from gui.gui_helpers import collect_report
+    with tempfile.TemporaryDirectory() as cache_dir:
+        collect_report(tokenizer, corpus_dir, os.devnull, cache_path=os.path.join(cache_dir, 'report_cache.sqlite3'))
+
+
+def _stage_report_cached(tokenizer, corpus_dir):
+    # The GUI report again over unchanged files; the first (untimed) run fills the cache
+    from gui.gui_helpers import collect_report
+    collect_report(tokenizer, corpus_dir, os.devnull, cache_path=os.path.join(corpus_dir, 'report_cache.sqlite3'))
+
+
+STAGES = {
+    'tokenize': _stage_tokenize,
+    'tokenized_batch': _stage_tokenized_batch,
+    'compact_batch': _stage_compact_batch,
+    'evaluate_experience': _stage_evaluate_experience,
+    'evaluate_performance': _stage_evaluate_performance,
+    'open_file': _stage_open_file,
+    'report': _stage_report,
+    'report_cached': _stage_report_cached,
+}
+
+# Stages that score the synthetic corpus written as files, like the GUI report reads them
+REPORT_STAGES = ('report', 'report_cached')
+
+
+def measure(stage, tokenizer, argument, repeat):
+    # A first run under tracemalloc gives the peak memory and warms up the page cache,
+    # then the median wall time over repeat runs (each starting with a cold normalization cache)
+    tokenizer.clear_normalization_cache()
+    tracemalloc.start()
+    stage(tokenizer, argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings = []
+    for _ in range(repeat):
+        tokenizer.clear_normalization_cache()
+        start = time.perf_counter()
+        stage(tokenizer, argument)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), peak
+
+
+def run_benchmarks(conversations=1000, lines=8, words_per_line=12, zipf_s=1.1, unknown_rate=0.2, repeat=3,
+                   stages=tuple(STAGES), tokens_path=DEFAULT_TOKENS_PATH, examples_path=DEFAULT_EXAMPLES_PATH, seed=0):
+    generator = CorpusGenerator(examples_path, tokens_path, zipf_s=zipf_s, unknown_rate=unknown_rate, seed=seed)
+    corpus = generator.corpus(conversations, lines, words_per_line)
+    tokenizer = Tokenizer.from_json(tokens_path)
+    token_count = sum(len(tokenizer.tokenize(text)) for text in corpus)
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'parameters': {'conversations': conversations, 'lines': lines, 'words_per_line': words_per_line,
+                       'zipf_s': zipf_s, 'unknown_rate': unknown_rate, 'repeat': repeat, 'seed': seed},
+        'tokens': token_count,
+        'stages': {},
+    }
+    try:
+        # Imported up front so loading tkinter is not measured as part of a stage
+        import gui.gui_helpers  # noqa: F401
+    except ImportError:
+        pass
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        if any(name in REPORT_STAGES for name in stages):
+            generator = CorpusGenerator(examples_path, tokens_path, zipf_s=zipf_s, unknown_rate=unknown_rate, seed=seed)
+            generator.write_corpus(corpus_dir, conversations, lines, words_per_line)
+        for name in stages:
+            argument = corpus_dir if name in REPORT_STAGES else corpus
+            try:
+                seconds, peak = measure(STAGES[name], tokenizer, argument, repeat)
+            except ImportError as e:
+                # The GUI helpers need tkinter and matplotlib
+                print(f"Skipping {name}: {e}", file=sys.stderr)
+                continue
+            results['stages'][name] = {
+                'seconds': seconds,
+                'conversations_per_second': conversations / seconds if seconds else None,
+                'tokens_per_second': token_count / seconds if seconds else None,
+                'peak_memory_bytes': peak,
+            }
+    return results
+
+
+def load_last_result(history_path):
+    if not os.path.exists(history_path):
+        return None
+    last = None
+    with open(history_path, 'r', encoding='utf-8') as history:
+        for line in history:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+
+def print_results(results, previous=None):
+    print(f"{results['parameters']['conversations']} conversations, {results['tokens']} tokens")
+    print(f"{'stage':<28}{'seconds':>10}{'conv/s':>12}{'tokens/s':>14}{'peak MiB':>10}{'vs last':>10}")
+    for name, stage in results['stages'].items():
+        change = ''
+        if previous and name in previous.get('stages', {}) and previous['parameters'] == results['parameters']:
+            change = f"{stage['seconds'] / previous['stages'][name]['seconds'] * 100 - 100:+.1f}%"
+        print(f"{name:<28}{stage['seconds']:>10.4f}{stage['conversations_per_second']:>12.1f}"
+              f"{stage['tokens_per_second']:>14.0f}{stage['peak_memory_bytes'] / 2**20:>10.2f}{change:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring pipeline on a synthetic corpus.")
+    parser.add_argument("-n", "--conversations", type=int, default=1000, help="Conversations in the synthetic corpus")
+    parser.add_argument("--lines", type=int, default=8, help="Lines per conversation")
+    parser.add_argument("--words-per-line", type=int, default=12, help="Words per synthesized line")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent of the word distribution (0 = uniform)")
+    parser.add_argument("--unknown-rate", type=float, default=0.2, help="Share of the vocabulary outside the lexicon")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the median is reported")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES), help="Stages to time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-t", "--tokens", default=DEFAULT_TOKENS_PATH, help="Path to tokens.json")
+    parser.add_argument("--examples", default=DEFAULT_EXAMPLES_PATH, help="Path to examples.json")
+    parser.add_argument("--history", help="JSON lines file the results are appended to, and compared against")
+    parser.add_argument("--generate", metavar="DIR", help="Only write the synthetic corpus to DIR and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging()
+    if args.generate:
+        generator = CorpusGenerator(args.examples, args.tokens, zipf_s=args.zipf_s, unknown_rate=args.unknown_rate, seed=args.seed)
+        paths = generator.write_corpus(args.generate, args.conversations, args.lines, args.words_per_line)
+        print(f"Wrote {len(paths)} conversations to {args.generate}")
+        return 0
+
+    results = run_benchmarks(args.conversations, args.lines, args.words_per_line, args.zipf_s, args.unknown_rate,
+                             args.repeat, args.stages, args.tokens, args.examples, args.seed)
+    previous = load_last_result(args.history) if args.history else None
+    print_results(results, previous)
+    if args.history:
+        with open(args.history, 'a', encoding='utf-8') as history:
+            history.write(json.dumps(results) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
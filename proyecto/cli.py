@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import collections
+import csv
+import glob
+import itertools
+import json
+import logging
+import functools
+import multiprocessing
+import os
+import sys
+from contextlib import nullcontext
+
+from logic import metrics
+from logic.pipeline import DEFAULT_READERS, conversation_id, run_pipeline
+from logic.report import ReportSummary
+from logic.scoring import RESULT_FIELDS, conversation_text, iter_dump_conversations, score_file, score_text
+from logic.worker import DEFAULT_TOKENS_PATH, call_with_metrics, init_worker, worker_cache, worker_tokenizer
+from utils import configure_logging, log_message
+
+
+def _score_task(task):
+    conversation_id, file_path, text = task
+    result = {"id": conversation_id, "file": file_path}
+    tokenizer = worker_tokenizer()
+    cache = worker_cache()
+    try:
+        with metrics.timed('score'):
+            if text is None and cache is not None:
+                result.update(cache.score_file(tokenizer, file_path))
+            elif text is None:
+                result.update(score_file(tokenizer, file_path))
+            else:
+                result.update(score_text(tokenizer, text))
+    except Exception as e:
+        log_message("Failed to score %s: %s", conversation_id, e, level=logging.ERROR)
+        metrics.count('errors')
+        result["error"] = str(e)
+    return result
+
+
+def iter_input_files(inputs):
+    # Expands directories (recursively, .txt files like generate_report) and glob patterns
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for file_name in sorted(files):
+                    if file_name.endswith(".txt"):
+                        yield os.path.join(root, file_name)
+        elif glob.has_magic(item):
+            yield from sorted(glob.glob(item, recursive=True))
+        else:
+            yield item
+
+
+def iter_stdin_conversations(stream, errors=None):
+    # One JSON object per line, shaped like the entries of examples.json: {"id": ..., "conversation": [...]}.
+    # A malformed line fails on its own: its error record is appended to errors (raised without errors)
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+            if not isinstance(item, dict) or "conversation" not in item:
+                raise ValueError('expected an object with a "conversation"')
+        except ValueError as e:
+            if errors is None:
+                raise
+            log_message("Invalid input on stdin line %d: %s", line_number, e, level=logging.ERROR)
+            metrics.count('errors')
+            errors.append({"id": f"stdin_{line_number}", "file": None, "error": f"line {line_number}: {e}"})
+            continue
+        yield item.get("id", f"stdin_{line_number}"), None, conversation_text(item["conversation"])
+
+
+def iter_dump_tasks(file_path):
+    # Each blank-line separated conversation of a dump becomes its own task, read lazily
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for index, conversation in enumerate(iter_dump_conversations(file)):
+            yield f"{stem}_{index}", file_path, conversation
+
+
+def iter_tasks(inputs, stdin=None, dump=False, errors=None):
+    for item in inputs:
+        if item == '-':
+            yield from iter_stdin_conversations(stdin if stdin is not None else sys.stdin, errors)
+        else:
+            for file_path in iter_input_files([item]):
+                if dump:
+                    yield from iter_dump_tasks(file_path)
+                else:
+                    yield conversation_id(file_path), file_path, None
+
+
+class JsonlWriter:
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, result):
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+class CsvWriter:
+    def __init__(self, output):
+        self.writer = csv.DictWriter(output, fieldnames=["id", "file"] + RESULT_FIELDS + ["error"])
+        self.writer.writeheader()
+
+    def write(self, result):
+        self.writer.writerow(result)
+
+
+WRITERS = {"jsonl": JsonlWriter, "csv": CsvWriter}
+
+
+class SummarizingWriter:
+    # Passes every result on to writer and aggregates it into a ReportSummary (--summary)
+    def __init__(self, writer):
+        self.writer = writer
+        self.summary = ReportSummary()
+
+    def write(self, result):
+        self.writer.write(result)
+        if "error" in result:
+            self.summary.add_error()
+        else:
+            self.summary.add(result["id"], result)
+
+
+def run(inputs, output, output_format="jsonl", tokens_path=DEFAULT_TOKENS_PATH, workers=None, chunksize=64, log_level=logging.WARNING, dump=False, cache_path=None, readers=None, summary_path=None,
+        metrics_path=None, profile_path=None):
+    writer = WRITERS[output_format](output)
+    if summary_path:
+        writer = SummarizingWriter(writer)
+    if metrics_path:
+        metrics.enable()
+
+    # Error records of malformed stdin lines, written in between the results; the runners may pull tasks
+    # from another thread, so they are queued here rather than written by the task iterator
+    input_errors = collections.deque()
+    rejected = 0
+
+    def write_input_errors():
+        nonlocal rejected
+        while input_errors:
+            writer.write(input_errors.popleft())
+            rejected += 1
+
+    def write(result):
+        with metrics.timed('output'):
+            write_input_errors()
+            writer.write(result)
+
+    tasks = iter_tasks(inputs, dump=dump, errors=input_errors)
+    with metrics.profiled(profile_path) if profile_path else nullcontext():
+        if profile_path:
+            # cProfile only sees the process it runs in, so the profiled run scores in-process
+            scored, failed = _run_in_process(tasks, write, tokens_path, log_level, cache_path)
+        elif readers or cache_path:
+            # Concurrent reads for slow mounts, and cache lookups before reading; results are written as they complete
+            scored, failed = asyncio.run(run_pipeline(tasks, write, tokens_path=tokens_path, workers=workers, readers=readers or DEFAULT_READERS,
+                                                      log_level=log_level, cache_path=cache_path))
+        else:
+            scored, failed = _run_pool(tasks, write, tokens_path, workers, chunksize, log_level)
+    write_input_errors()
+    scored += rejected
+    failed += rejected
+    if summary_path:
+        writer.summary.write(summary_path)
+    if metrics_path:
+        metrics.active().write(metrics_path)
+        metrics.disable()
+    return scored, failed
+
+
+def _run_pool(tasks, write, tokens_path, workers, chunksize, log_level):
+    scored = 0
+    failed = 0
+    workers = workers or os.cpu_count()
+    collect_metrics = metrics.active() is not None
+    score_task = functools.partial(call_with_metrics, _score_task) if collect_metrics else _score_task
+    with multiprocessing.Pool(processes=workers, initializer=init_worker, initargs=(tokens_path, log_level, collect_metrics)) as pool:
+        # Pool.imap drains its input eagerly, so submit bounded batches to keep memory flat on huge inputs
+        while True:
+            batch = list(itertools.islice(tasks, workers * chunksize * 4))
+            if not batch:
+                break
+            for result in pool.imap(score_task, batch, chunksize=chunksize):
+                if collect_metrics:
+                    result, snapshot = result
+                    metrics.merge(snapshot)
+                write(result)
+                scored += 1
+                failed += "error" in result
+    log_message("Scored %d conversations (%d failed)", scored, failed, level=logging.INFO)
+    return scored, failed
+
+
+def _run_in_process(tasks, write, tokens_path, log_level, cache_path):
+    scored = 0
+    failed = 0
+    init_worker(tokens_path, log_level, cache_path=cache_path)
+    for task in tasks:
+        result = _score_task(task)
+        write(result)
+        scored += 1
+        failed += "error" in result
+    log_message("Scored %d conversations (%d failed)", scored, failed, level=logging.INFO)
+    return scored, failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score conversations without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="Files, directories or glob patterns to score. Use '-' to read JSON lines from stdin.")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("-f", "--format", choices=sorted(WRITERS), default="jsonl", help="Output format (default: jsonl)")
+    parser.add_argument("-t", "--tokens", default=DEFAULT_TOKENS_PATH, help="Path to tokens.json")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=64, help="Conversations sent to a worker at a time")
+    parser.add_argument("--dump", action="store_true", help="Treat each input file as a dump of conversations separated by blank lines")
+    parser.add_argument("--cache", help="SQLite result cache; files whose content and lexicon are unchanged are not read or scored again (uses the asyncio pipeline)")
+    parser.add_argument("--summary", help="Also write aggregate statistics (percentiles, ATC vs EXP) to this JSON file")
+    parser.add_argument("--readers", type=int, help="Read files with this many concurrent readers (asyncio pipeline); results are written in completion order")
+    parser.add_argument("--metrics", help="Write per-stage timing histograms and counters to this file: JSON for a .json path, Prometheus text otherwise")
+    parser.add_argument("--profile", help="Score in a single process under cProfile and save the profile to this file (read it with python -m pstats)")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase log verbosity (-v info, -vv debug)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile and args.readers:
+        print("--profile cannot be combined with --readers", file=sys.stderr)
+        return 2
+    log_level = [logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)]
+    configure_logging(log_level)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            _, failed = run(args.inputs, output, args.format, args.tokens, args.workers, args.chunksize, log_level, args.dump, args.cache, args.readers, args.summary,
+                            args.metrics, args.profile)
+    else:
+        _, failed = run(args.inputs, sys.stdout, args.format, args.tokens, args.workers, args.chunksize, log_level, args.dump, args.cache, args.readers, args.summary,
+                        args.metrics, args.profile)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
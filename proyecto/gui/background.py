@@ -0,0 +1,82 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import log_message
+
+POLL_INTERVAL_MS = 50
+
+
+class BackgroundTask:
+    """
+    Handle for work submitted to a BackgroundWorker.
+    The work function receives it to report progress and check for cancellation;
+    the GUI keeps it to cancel the work.
+    """
+
+    def __init__(self, worker, on_done=None, on_error=None, on_progress=None):
+        self._worker = worker
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report_progress(self, done, total):
+        # Called from the worker thread; the callback runs on the Tk main thread
+        if self.on_progress:
+            self._worker._post(self.on_progress, done, total)
+
+
+class BackgroundWorker:
+    """
+    Runs slow work (file I/O, tokenization, evaluation) off the Tk main thread.
+    Callbacks are queued and run on the main thread by polling the queue with root.after,
+    since Tk widgets must only be touched from the thread running mainloop.
+    """
+
+    def __init__(self, root, max_workers=2):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-worker")
+        self._callbacks = queue.Queue()
+        self._poll_id = self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def submit(self, func, on_done=None, on_error=None, on_progress=None):
+        # func(task) runs in the pool; on_done(result) / on_error(exception) run on the main thread
+        task = BackgroundTask(self, on_done, on_error, on_progress)
+        self._executor.submit(self._run, task, func)
+        return task
+
+    def _run(self, task, func):
+        try:
+            result = func(task)
+        except Exception as e:
+            log_message("Background task failed: %s", e)
+            if task.on_error:
+                self._post(task.on_error, e)
+            return
+        if task.on_done:
+            self._post(task.on_done, result)
+
+    def _post(self, callback, *args):
+        self._callbacks.put((callback, args))
+
+    def _poll(self):
+        # Reschedule first so a failing callback does not stop the polling
+        self._poll_id = self.root.after(POLL_INTERVAL_MS, self._poll)
+        while True:
+            try:
+                callback, args = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+
+    def shutdown(self):
+        self.root.after_cancel(self._poll_id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,7 +1,11 @@
+import logging
 import tkinter as tk
-from tkinter import filedialog, messagebox
-from gui.gui_helpers import open_text_file, open_json_file, update_tokens, generate_report
+from tkinter import filedialog, messagebox, ttk
+from gui.background import BackgroundWorker
+from gui.gui_helpers import open_text_file, open_json_file, update_tokens, collect_report, finish_report
+from logic import metrics
 from logic.tokenizer import Tokenizer
+from utils import configure_logging, handle_error, log_message
 
 class LanguageTokenizerGUI:
     def __init__(self, root):
@@ -10,6 +14,12 @@ class LanguageTokenizerGUI:
         self.root.title("Tokenizador de Lenguaje Natural")
         self.root.geometry("900x700")
         self.root.minsize(900, 700)
+        # File loading and report scoring run here so the window stays responsive
+        self.worker = BackgroundWorker(self.root)
+        self.report_task = None
+        # With TOKENIZER_METRICS=<file>, stage timings of the session are written there on exit
+        self.metrics_path = metrics.enable_from_environment()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         self._setup_ui()
 
     def _setup_ui(self):
@@ -43,6 +53,17 @@ class LanguageTokenizerGUI:
         report_button.grid(padx=10, pady=10)
         report_button.bind("<Enter>", lambda e: report_button.config(bg="#45a049"))
         report_button.bind("<Leave>", lambda e: report_button.config(bg="#4CAF50"))
+        self.report_button = report_button
+
+        # Progress of the running report, with a button to cancel it
+        progress_frame = tk.Frame(self.scrollable_frame)
+        progress_frame.grid(padx=10, pady=5, sticky="ew")
+        self.report_progress = ttk.Progressbar(progress_frame, orient="horizontal", length=300, mode="determinate")
+        self.report_progress.pack(side=tk.LEFT, padx=5)
+        self.report_status = tk.Label(progress_frame, text="", font=("Helvetica", 12))
+        self.report_status.pack(side=tk.LEFT, padx=5)
+        self.cancel_report_button = tk.Button(progress_frame, text="Cancel", command=self.cancel_report, font=("Helvetica", 12), state=tk.DISABLED)
+        self.cancel_report_button.pack(side=tk.LEFT, padx=5)
 
         self.canvas.pack(side="left", fill="both", expand=True)
         self.scrollbar.pack(side="right", fill="y")
@@ -66,7 +87,7 @@ class LanguageTokenizerGUI:
 
         # Button to open the file
         open_button = tk.Button(frame, text=f"Open {label_text}", command=lambda: open_text_file(
-            entry, text_widget, self.tokenizer, undefined_words_frame, evaluation_frame), font=("Helvetica", 12), bg="#4CAF50", fg="white")
+            entry, text_widget, self.tokenizer, undefined_words_frame, evaluation_frame, worker=self.worker), font=("Helvetica", 12), bg="#4CAF50", fg="white")
         open_button.grid(row=1, column=0, sticky="w", padx=5, pady=5)
         open_button.bind("<Enter>", lambda e: open_button.config(bg="#45a049"))
         open_button.bind("<Leave>", lambda e: open_button.config(bg="#4CAF50"))
@@ -80,7 +101,7 @@ class LanguageTokenizerGUI:
         undefined_words_frame.grid(row=3, column=1, sticky="nsew", padx=5, pady=5)
 
         # Open the default file
-        open_text_file(entry, text_widget, self.tokenizer, undefined_words_frame, evaluation_frame, default_path=default_path)
+        open_text_file(entry, text_widget, self.tokenizer, undefined_words_frame, evaluation_frame, default_path=default_path, worker=self.worker)
 
         # Configure grid weights
         frame.grid_rowconfigure(2, weight=1)
@@ -98,7 +119,7 @@ class LanguageTokenizerGUI:
         menu.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Open JSON File", command=lambda: open_json_file(self.tokenizer))
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.close)
 
         edit_menu = tk.Menu(menu, tearoff=0)
         menu.add_cascade(label="Edit", menu=edit_menu)
@@ -107,12 +128,69 @@ class LanguageTokenizerGUI:
     def generate_report(self):
         examples_folder = "proyecto/ejemplos"
         report_file = "proyecto/report.txt"
-        generate_report(self.tokenizer, examples_folder, report_file)
+        summary_file = "proyecto/report.json"
+        cache_path = "proyecto/report_cache.sqlite3"
+        if self.report_task is not None:
+            return
+
+        def update_progress(done, total):
+            self.report_progress.config(maximum=total, value=done)
+            self.report_status.config(text=f"{done}/{total} files")
+
+        def report_done(collected):
+            self._reset_report_controls()
+            summary, errors = collected
+            if task.cancelled:
+                self.report_status.config(text=f"Report cancelled, {summary.files} files written to {report_file}")
+                return
+            finish_report(report_file, summary, errors)
+
+        def report_failed(e):
+            self._reset_report_controls()
+            handle_error("Failed to generate the report", e)
+
+        self.report_button.config(state=tk.DISABLED)
+        self.cancel_report_button.config(state=tk.NORMAL)
+        self.report_status.config(text="Scoring files...")
+        # "Add Word" keeps changing self.tokenizer on this thread while the report is scored in the background
+        tokenizer = self.tokenizer.snapshot()
+        task = self.worker.submit(
+            lambda task: collect_report(tokenizer, examples_folder, report_file, progress=task.report_progress, cancel_event=task.cancel_event, cache_path=cache_path, summary_file=summary_file),
+            on_done=report_done, on_error=report_failed, on_progress=update_progress)
+        self.report_task = task
+
+    def cancel_report(self):
+        if self.report_task is not None:
+            self.report_task.cancel()
+            self.report_status.config(text="Cancelling...")
+
+    def _reset_report_controls(self):
+        self.report_task = None
+        self.report_button.config(state=tk.NORMAL)
+        self.cancel_report_button.config(state=tk.DISABLED)
+
+    def close(self):
+        if self.report_task is not None:
+            self.report_task.cancel()
+        self.worker.shutdown()
+        # Fold the words classified this session into tokens.json
+        if self.tokenizer.lexicon_store is not None:
+            try:
+                self.tokenizer.lexicon_store.compact()
+            except Exception as e:
+                log_message("Failed to compact the lexicon journal: %s", e, level=logging.ERROR)
+        if self.metrics_path:
+            try:
+                metrics.active().write(self.metrics_path)
+            except Exception as e:
+                log_message("Failed to write the metrics: %s", e, level=logging.ERROR)
+        self.root.quit()
 
     def run(self):
         self.root.mainloop()
 
 if __name__ == "__main__":
+    configure_logging()
     root = tk.Tk()
     app = LanguageTokenizerGUI(root)
     app.run()
@@ -2,24 +2,24 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 from utils import read_file, log_message, handle_error
 from logic.tokenizer import Tokenizer
-import json
+from logic.scoring import EvaluationResults
+from logic.pipeline import conversation_id, run_pipeline
+from logic.document import ScoredDocument
+from gui.highlighter import LazyHighlighter
+from logic.report import ReportWriter, draw_summary_chart
+import asyncio
 import os
-import matplotlib.pyplot as plt
 
-
-def process_tokens(tokenizer, text):
-    log_message("process_tokens called")
-    tokens = tokenizer.tokenize(text)
-    non_defined_words = identify_non_defined_words(tokenizer, tokens)
-    return tokens, non_defined_words
+# Highlighter of the document shown in each Text widget
+_highlighters = {}
 
 def create_listbox_frame(parent, non_defined_words):
     log_message("create_listbox_frame called")
     listbox_frame = tk.Frame(parent, bg="#f0f0f0")
     tk.Label(listbox_frame, text="Undefined Words:", font=("Helvetica", 12, "bold"), bg="#f0f0f0").pack(padx=10, pady=5)
     listbox = tk.Listbox(listbox_frame, selectmode=tk.SINGLE, font=("Helvetica", 12))
-    for original_word, normalized_word in non_defined_words.items():
-        listbox.insert(tk.END, f"{normalized_word} ({original_word})")
+    # One insert call for all the words instead of one Tk round trip per word
+    listbox.insert(tk.END, *[f"{normalized_word} ({original_word})" for original_word, normalized_word in non_defined_words.items()])
     listbox.pack(padx=10, pady=5)
     return listbox_frame, listbox
 
@@ -32,28 +32,44 @@ def create_category_frame(parent, category_var):
         tk.Radiobutton(category_frame, text=text, variable=category_var, value=value, font=("Helvetica", 12), bg="#f0f0f0").pack(side=tk.LEFT, padx=10, pady=5)
     return category_frame
 
-def open_text_file(entry, text_widget, tokenizer, undefined_words_frame, evaluation_frame, default_path=None):
+def load_text_file(tokenizer, file_path):
+    # Reads and evaluates a file without touching any widget, so it can run in a background thread
+    text = read_file(file_path)
+    log_message("File read successfully: %s", file_path)
+    log_message("Text in file:\n%s", text)
+    return ScoredDocument(tokenizer, text)
+
+def open_text_file(entry, text_widget, tokenizer, undefined_words_frame, evaluation_frame, default_path=None, worker=None):
     log_message("open_text_file called")
-    log_message(f"open_text_file called with default_path: {default_path}")
+    log_message("open_text_file called with default_path: %s", default_path)
     file_path = default_path or filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
-    log_message(f"File path selected: {file_path}")
+    log_message("File path selected: %s", file_path)
 
-    if file_path:
-        try:
-            text = read_file(file_path)
-            log_message(f"File read successfully: {file_path}")
-            log_message(f"Text in file:\n{text}")
+    if not file_path:
+        return
 
+    def show_loaded_file(document):
+        try:
             update_entry_widget(entry, file_path)
-            tokens, non_defined_words = process_tokens(tokenizer, text)
-            update_text_widget_with_tokens(text_widget, text, tokens, non_defined_words, tokenizer)
+            update_text_widget_with_tokens(text_widget, document)
 
-            display_undefined_words(non_defined_words, tokenizer, undefined_words_frame, text_widget, text, evaluation_frame)
-            evaluation_results = evaluate_text(tokens, tokenizer, non_defined_words, text)
-            display_evaluation_results(evaluation_frame, evaluation_results)
+            display_undefined_words(document, tokenizer, undefined_words_frame, text_widget, evaluation_frame)
+            display_evaluation_results(evaluation_frame, document.evaluation_results())
+
+        except Exception as e:
+            handle_error("Failed to process the file", e)
 
+    if worker is None:
+        try:
+            document = load_text_file(tokenizer, file_path)
         except Exception as e:
             handle_error("Failed to process the file", e)
+            return
+        show_loaded_file(document)
+    else:
+        worker.submit(lambda task: load_text_file(tokenizer, file_path),
+                      on_done=show_loaded_file,
+                      on_error=lambda e: handle_error("Failed to process the file", e))
 
 def update_entry_widget(entry, file_path):
     log_message("update_entry_widget called")
@@ -62,58 +78,35 @@ def update_entry_widget(entry, file_path):
     entry.insert(0, file_path)
     entry.config(state=tk.DISABLED)
 
-def update_text_widget_with_tokens(text_widget, text, tokens, non_defined_words, tokenizer):
+def update_text_widget_with_tokens(text_widget, document):
+    # Inserts the text in one call; the undefined words are tagged around the visible region, the rest while scrolling
     log_message("update_text_widget_with_tokens called")
+    previous = _highlighters.pop(text_widget, None)
+    if previous is not None:
+        previous.detach()
     text_widget.delete(1.0, tk.END)
     text_widget.tag_configure('undefined', font=('Helvetica', 12, 'bold'), foreground='red')
-    text_widget.tag_configure('original_undefined', font=('Helvetica', 12, 'bold'), foreground='red')
-
-    longest_line_length = 0
-
-    for line in text.split('\n'):
-        if len(line) > longest_line_length:
-            longest_line_length = len(line)
-        for word in line.split():
-            normalized_word = tokenizer.normalize_word(word)
-            if normalized_word in non_defined_words.values():
-                text_widget.insert(tk.END, word + ' ', 'undefined')
-            elif word in non_defined_words:
-                text_widget.insert(tk.END, word + ' ', 'original_undefined')
-            else:
-                text_widget.insert(tk.END, word + ' ')
-        text_widget.insert(tk.END, '\n')
+    text_widget.insert(tk.END, document.text)
 
-    non_empty_lines = [line for line in text.split('\n') if line.strip()]
+    highlighter = LazyHighlighter(text_widget, document)
+    _highlighters[text_widget] = highlighter
+    highlighter.refresh()
+
+    lines = document.text.split('\n')
+    longest_line_length = max((len(line) for line in lines), default=0)
+    non_empty_lines = [line for line in lines if line.strip()]
     text_widget.config(height=min(len(non_empty_lines), 20), width=longest_line_length)
 
-def identify_non_defined_words(tokenizer, tokens):
-    log_message("identify_non_defined_words called")
-    non_defined_words = {}
-    for token, normalized_token in tokens:
-        if (normalized_token not in tokenizer.positive_words and 
-            normalized_token not in tokenizer.negative_words and 
-            normalized_token not in tokenizer.neutral_words):
-            non_defined_words[token] = normalized_token
-            log_message(f"Normalized word: {normalized_token} token: {token}")
-    return non_defined_words
-
-def evaluate_text(tokens, tokenizer, non_defined_words, conversation):
-    log_message("evaluate_text called")
-    performance_score = tokenizer.evaluate_performance(conversation)
-    experience_results = tokenizer.evaluate_experience(conversation)
-    
-    return {
-        "Undefined Words": len(non_defined_words),
-        "Positive Words": experience_results["positive"],
-        "Negative Words": experience_results["negative"],
-        "Neutral Words": experience_results["neutral"],
-        "Experience Score": experience_results["score"],
-        "Performance Score": performance_score
-    }
-
-def display_undefined_words(non_defined_words, tokenizer, frame, text_widget, text, evaluation_frame):
+def update_word_highlight(text_widget, document, normalized_word, undefined):
+    # Re-tags only the occurrences of one word instead of rebuilding the whole widget
+    highlighter = _highlighters.get(text_widget)
+    if highlighter is not None and highlighter.document is document:
+        highlighter.update_word(normalized_word, undefined)
+
+def display_undefined_words(document, tokenizer, frame, text_widget, evaluation_frame):
     log_message("display_undefined_words called")
-    log_message(f"Displaying undefined words: {non_defined_words}")
+    non_defined_words = document.non_defined_words
+    log_message("Displaying undefined words: %s", non_defined_words)
     for widget in frame.winfo_children():
         widget.destroy()
 
@@ -121,34 +114,39 @@ def display_undefined_words(non_defined_words, tokenizer, frame, text_widget, te
         log_message("No undefined words to display.")
         return
 
-    def add_word_to_json(word, category):
+    def add_word_to_json(item, category):
+        # item is a listbox entry, "normalized (original)". The original spelling goes into the lexicon,
+        # which normalizes it again; the normalizer maps words to stems and is not applied to its own output
         log_message("add_word_to_json called")
-        log_message(f"Adding word to JSON: {word}, category: {category}")
-        getattr(tokenizer, f"{category}_words").append(word)
-
-        with open('proyecto/logic/tokens.json', 'r+', encoding='utf-8') as file:
-            data = json.load(file)
-            data['BUENAS'] = tokenizer.positive_words
-            data['MALAS'] = tokenizer.negative_words
-            data['NEUTRAS'] = tokenizer.neutral_words
-            file.seek(0)
-            json.dump(data, file, ensure_ascii=False, indent=4)
-            file.truncate()
-        log_message(f"Word added to JSON and file updated: {word}")
-
-        # Find the item in the listbox and delete it
-        for i in range(listbox.size()):
-            item = listbox.get(i)
-            if item.startswith(word):
+        if not item:
+            return
+        word, original_word = item.split(' ', 1)
+        original_word = original_word[1:-1]
+        log_message("Adding word to JSON: %s (%s), category: %s", original_word, word, category)
+        # Words of other categories with the same normalized form move along, since they share its entry
+        moved = tokenizer.set_category(original_word, category)
+
+        # One journal append per word instead of rewriting tokens.json; the moved words are journaled too,
+        # so a reload gives them the same category
+        if tokenizer.lexicon_store is not None:
+            for moved_word in [original_word] + moved:
+                tokenizer.lexicon_store.set_category(moved_word, category)
+        log_message("Word added to JSON and file updated: %s", original_word)
+        if moved:
+            messagebox.showinfo("Words moved", f"{', '.join(moved)} normalize like '{original_word}' ({word}) and were also moved to {category}.")
+
+        # Delete every listbox item of the word, one per original spelling, reading the items in one call
+        items = listbox.get(0, tk.END)
+        for i in reversed(range(len(items))):
+            if items[i].split(' ')[0] == word:
                 listbox.delete(i)
-                break
-
-        tokens, non_defined_words = process_tokens(tokenizer, text)
-        update_text_widget_with_tokens(text_widget, text, tokens, non_defined_words, tokenizer)
 
-        evaluation_results = evaluate_text(tokens, tokenizer, non_defined_words, text)
-        log_message(f"Updated evaluation results: {evaluation_results}")
-        display_evaluation_results(evaluation_frame, evaluation_results)
+        # Only the counts and highlights of this word change
+        if document.reclassify(word):
+            update_word_highlight(text_widget, document, word, undefined=False)
+            evaluation_results = document.evaluation_results()
+            log_message("Updated evaluation results: %s", evaluation_results)
+            display_evaluation_results(evaluation_frame, evaluation_results)
 
     listbox_frame, listbox = create_listbox_frame(frame, non_defined_words)
     listbox_frame.grid(row=0, column=0, padx=10, pady=5, sticky="n")
@@ -157,26 +155,26 @@ def display_undefined_words(non_defined_words, tokenizer, frame, text_widget, te
     category_frame = create_category_frame(frame, category_var)
     category_frame.grid(row=0, column=1, padx=10, pady=5, sticky="n")
 
-    tk.Button(category_frame, text="Add Word", command=lambda: add_word_to_json(listbox.get(tk.ACTIVE).split(' ')[0], category_var.get()), font=("Helvetica", 12)).pack(side=tk.LEFT, padx=10, pady=10)
+    tk.Button(category_frame, text="Add Word", command=lambda: add_word_to_json(listbox.get(tk.ACTIVE), category_var.get()), font=("Helvetica", 12)).pack(side=tk.LEFT, padx=10, pady=10)
     
 def display_evaluation_results(frame, results):
     log_message("display_evaluation_results called")
-    log_message(f"Displaying evaluation results: {results}")
+    log_message("Displaying evaluation results: %s", results)
     for widget in frame.winfo_children():
         widget.destroy()
 
     for key, value in results.items():
         tk.Label(frame, text=f"{key}: {value}", font=("Helvetica", 12)).pack(padx=10, pady=5)
-        log_message(f"Displayed result: {key}: {value}")
+        log_message("Displayed result: %s: %s", key, value)
 
 def open_json_file(tokenizer):
     log_message("open_json_file called")
     file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
-    log_message(f"JSON file path selected: {file_path}")
+    log_message("JSON file path selected: %s", file_path)
     if file_path:
         try:
             tokenizer = Tokenizer.from_json(file_path)
-            log_message(f"JSON file loaded successfully: {file_path}")
+            log_message("JSON file loaded successfully: %s", file_path)
             messagebox.showinfo("Success", "JSON file loaded successfully")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load JSON file: {e}")
@@ -187,10 +185,18 @@ def update_tokens(tokenizer, root):
     def save_tokens():
         log_message("save_tokens called")
         try:
-            tokenizer.positive_words = positive_text.get("1.0", tk.END).strip().split("\n")
-            tokenizer.negative_words = negative_text.get("1.0", tk.END).strip().split("\n")
-            tokenizer.neutral_words = neutral_text.get("1.0", tk.END).strip().split("\n")
-            log_message(f"Tokens updated: positive_words={tokenizer.positive_words}, negative_words={tokenizer.negative_words}, neutral_words={tokenizer.neutral_words}")
+            words = {
+                'positive': positive_text.get("1.0", tk.END).strip().split("\n"),
+                'negative': negative_text.get("1.0", tk.END).strip().split("\n"),
+                'neutral': neutral_text.get("1.0", tk.END).strip().split("\n"),
+            }
+            if tokenizer.lexicon_store is not None:
+                # Words another process classified while the dialog was open are kept as that process left them
+                words = tokenizer.lexicon_store.replace(words)
+            tokenizer.positive_words = words['positive']
+            tokenizer.negative_words = words['negative']
+            tokenizer.neutral_words = words['neutral']
+            log_message("Tokens updated: positive_words=%s, negative_words=%s, neutral_words=%s", tokenizer.positive_words, tokenizer.negative_words, tokenizer.neutral_words)
             update_window.destroy()
             messagebox.showinfo("Success", "Tokens updated successfully")
         except Exception as e:
@@ -213,57 +219,52 @@ def update_tokens(tokenizer, root):
 
     save_button = tk.Button(update_window, text="Save", command=save_tokens, font=("Helvetica", 12))
     save_button.pack(padx=10, pady=10)
-def generate_report(tokenizer, examples_folder, report_file):
-    log_message("generate_report called")
-    report_lines = []
-    file_names = []
-    positive_scores = []
-    negative_scores = []
-    neutral_scores = []
-    experience_scores = []
-    performance_scores = []
-
-    for root, _, files in os.walk(examples_folder):
-        for file_name in files:
-            if file_name.endswith(".txt"):
-                file_path = os.path.join(root, file_name)
-                try:
-                    text = read_file(file_path)
-                    tokens, non_defined_words = process_tokens(tokenizer, text)
-                    evaluation_results = evaluate_text(tokens, tokenizer, non_defined_words, text)  # Pass 'text' as 'conversation'
-                    report_lines.append(f"File: {file_name}")
-                    for key, value in evaluation_results.items():
-                        report_lines.append(f"{key}: {value}")
-                    report_lines.append("\n")
-
-                    file_names.append(file_name)
-                    positive_scores.append(evaluation_results.get('Positive Words', 0))
-                    negative_scores.append(evaluation_results.get('Negative Words', 0))
-                    neutral_scores.append(evaluation_results.get('Neutral Words', 0))
-                    experience_scores.append(evaluation_results.get('Experience Score', 0))
-                    performance_scores.append(evaluation_results.get('Performance Score', 0))
-                except Exception as e:
-                    handle_error(f"Failed to process file: {file_path}", e)
-
-    with open(report_file, 'w', encoding='utf-8') as report:
-        report.write("\n".join(report_lines))
-    log_message(f"Report generated: {report_file}")
+def collect_report(tokenizer, examples_folder, report_file, progress=None, cancel_event=None, cache_path=None, summary_file=None):
+    # Scores every .txt file of the folder through the asyncio pipeline, writing each result to report_file
+    # as soon as it is scored; safe to run in a background thread. Returns the ReportSummary and
+    # [(file_path, error)]. If cancel_event is set it stops early, leaving the partial report with a note at
+    # the end. With cache_path, unchanged files are not scored again (see ResultCache); with summary_file
+    # the summary is also saved as JSON.
+    log_message("collect_report called")
+    file_paths = _report_files(examples_folder)
+    errors = []
+    with ReportWriter(report_file) as report:
+        def collect(result):
+            if "error" in result:
+                errors.append((result["file"], result["error"]))
+                report.write_error(result["file"], result["error"])
+            else:
+                report.write(os.path.basename(result["file"]), EvaluationResults.from_dict(result))
+
+        def report_progress(done, _):
+            if progress:
+                progress(done, len(file_paths))
+
+        # Reads overlap and large files are streamed rather than read whole; results are written in completion order
+        tasks = [(conversation_id(file_path), file_path, None) for file_path in file_paths]
+        asyncio.run(run_pipeline(tasks, collect, tokenizer, workers=0, cancel_event=cancel_event, progress=report_progress,
+                                 cache_path=cache_path))
+        if cancel_event is not None and cancel_event.is_set():
+            report.close(f"Report cancelled after {report.summary.files} files")
+    if summary_file is not None:
+        report.summary.write(summary_file)
+    return report.summary, errors
+
+def _report_files(examples_folder):
+    return [os.path.join(root, file_name)
+            for root, _, files in os.walk(examples_folder)
+            for file_name in files if file_name.endswith(".txt")]
+
+def finish_report(report_file, summary, errors=()):
+    # Reports errors and draws the summary graph; must run on the Tk main thread.
+    # The graph is built from the aggregated summary, so it takes the same time for any number of files.
+    for file_path, e in errors:
+        handle_error(f"Failed to process file: {file_path}", e)
+
+    log_message("Report generated: %s", report_file)
     messagebox.showinfo("Success", f"Report generated: {report_file}")
 
-    # Generate graph
-    x = range(len(file_names))
-    plt.figure(figsize=(10, 6))
-    plt.plot(x, positive_scores, label='Positive', marker='o')
-    plt.plot(x, negative_scores, label='Negative', marker='o')
-    plt.plot(x, neutral_scores, label='Neutral', marker='o')
-    plt.plot(x, experience_scores, label='Experience', marker='o')
-    plt.plot(x, performance_scores, label='Performance', marker='o')
-    plt.xticks(x, file_names, rotation='vertical')
-    plt.xlabel('Files')
-    plt.ylabel('Scores')
-    plt.title('Evaluation Scores per File')
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(report_file.replace('.txt', '.png'))
+    draw_summary_chart(summary, report_file.replace('.txt', '.png'))
+    # matplotlib is only loaded the first time a report is drawn
+    import matplotlib.pyplot as plt
     plt.show()
-    log_message(f"Graph generated: {report_file.replace('.txt', '.png')}")
\ No newline at end of file
@@ -0,0 +1,92 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from utils import log_message
+
+# Lines tagged at a time; the chunks in view and the next one are tagged, the rest when scrolled to
+CHUNK_LINES = 100
+
+
+class LazyHighlighter:
+    """
+    Tags the undefined words of a ScoredDocument shown in a Text widget, one chunk of lines at a
+    time: only the chunks around the visible region are tagged, the others when they are scrolled
+    into view. Each chunk is tagged with a single tag_add call whose ranges come from the token
+    offsets, converted to line.column indices here instead of asking Tk to count characters.
+    Categories are read from the document when a chunk is tagged, so words classified meanwhile
+    are never highlighted.
+    """
+
+    def __init__(self, text_widget, document, tag='undefined'):
+        self.text_widget = text_widget
+        self.document = document
+        self.tag = tag
+        # Character offset of the first character of each line
+        self.line_starts = array('I', [0])
+        newline = document.text.find('\n')
+        while newline != -1:
+            self.line_starts.append(newline + 1)
+            newline = document.text.find('\n', newline + 1)
+        self.tagged_chunks = set()
+        self._pending = None
+        text_widget.config(yscrollcommand=self._schedule_refresh)
+
+    def index(self, offset):
+        # Text widget index of a character offset of the document
+        line = bisect_right(self.line_starts, offset) - 1
+        return f"{line + 1}.{offset - self.line_starts[line]}"
+
+    def _chunk_of(self, offset):
+        return (bisect_right(self.line_starts, offset) - 1) // CHUNK_LINES
+
+    def refresh(self):
+        # Tags the chunks of the visible lines and the chunk below them
+        self._pending = None
+        first_line = int(self.text_widget.index('@0,0').split('.')[0]) - 1
+        last_line = int(self.text_widget.index(f'@0,{self.text_widget.winfo_height()}').split('.')[0]) - 1
+        last_chunk = (len(self.line_starts) - 1) // CHUNK_LINES
+        for chunk in range(first_line // CHUNK_LINES, min(last_line // CHUNK_LINES + 1, last_chunk) + 1):
+            if chunk not in self.tagged_chunks:
+                self.tag_chunk(chunk)
+
+    def tag_chunk(self, chunk):
+        self.tagged_chunks.add(chunk)
+        first_line = chunk * CHUNK_LINES
+        end_line = first_line + CHUNK_LINES
+        start = self.line_starts[first_line]
+        end = self.line_starts[end_line] if end_line < len(self.line_starts) else len(self.document.text)
+
+        tokens = self.document.tokens
+        normalized = tokens.vocabulary.normalized
+        categories = self.document.categories
+        ranges = []
+        for index in range(bisect_left(tokens.starts, start), bisect_left(tokens.starts, end)):
+            if categories[normalized(tokens.token_ids[index])] is None:
+                ranges.extend((self.index(tokens.starts[index]), self.index(tokens.ends[index])))
+        if ranges:
+            self.text_widget.tag_add(self.tag, *ranges)
+        log_message("Tagged lines %d-%d: %d undefined words", first_line + 1, end_line, len(ranges) // 2)
+
+    def update_word(self, normalized_word, undefined):
+        # Re-tags the occurrences of one word in the chunks already tagged; the others are tagged when shown
+        ranges = []
+        for start, end in self.document.positions(normalized_word):
+            if self._chunk_of(start) in self.tagged_chunks:
+                ranges.extend((self.index(start), self.index(end)))
+        if ranges:
+            if undefined:
+                self.text_widget.tag_add(self.tag, *ranges)
+            else:
+                self.text_widget.tag_remove(self.tag, *ranges)
+
+    def _schedule_refresh(self, *_):
+        # yscrollcommand fires on every scroll step; tag once the scrolling events have been handled
+        if self._pending is None:
+            self._pending = self.text_widget.after_idle(self.refresh)
+
+    def detach(self):
+        # Stops following the scrolling, before another document is shown in the widget
+        if self._pending is not None:
+            self.text_widget.after_cancel(self._pending)
+            self._pending = None
+        self.text_widget.config(yscrollcommand='')
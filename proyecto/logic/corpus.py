@@ -0,0 +1,99 @@
+import numpy as np
+
+from logic.scoring import EvaluationResults
+from logic.token_array import Vocabulary
+from logic.tokenizer import CATEGORIES, TOKEN_PATTERN
+
+# Column of each category in CorpusScores.counts; undefined words go in the last one
+CATEGORY_CODES = {category: code for code, category in enumerate(CATEGORIES)}
+UNDEFINED_CODE = len(CATEGORIES)
+
+
+class CorpusScores:
+    """
+    Scores of a whole corpus held as NumPy arrays.
+    counts[i] holds the positive, negative, neutral and undefined token counts of document i,
+    undefined_words[i] its distinct undefined tokens and performance[i] its performance score.
+    term_frequencies / document_frequencies are indexed like vocabulary (the normalized words).
+    """
+
+    def __init__(self, vocabulary, term_frequencies, document_frequencies, categories, counts, undefined_words, performance):
+        self.vocabulary = vocabulary
+        self.term_frequencies = term_frequencies
+        self.document_frequencies = document_frequencies
+        self.categories = categories
+        self.counts = counts
+        self.undefined_words = undefined_words
+        self.performance = performance
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def experience(self):
+        return self.counts[:, CATEGORY_CODES['positive']] - self.counts[:, CATEGORY_CODES['negative']]
+
+    def results(self, index):
+        # Same keys and values as scoring.evaluate_text for one document
+        counts = self.counts[index]
+        return EvaluationResults(int(self.undefined_words[index]), int(counts[CATEGORY_CODES['positive']]),
+                                 int(counts[CATEGORY_CODES['negative']]), int(counts[CATEGORY_CODES['neutral']]),
+                                 int(self.performance[index]))
+
+    def top_terms(self, n=20, category=None):
+        # Most frequent normalized words of the corpus, optionally of one category ('undefined' included)
+        frequencies = self.term_frequencies
+        if category is not None:
+            code = UNDEFINED_CODE if category == 'undefined' else CATEGORY_CODES[category]
+            frequencies = np.where(self.categories == code, frequencies, 0)
+        order = np.argsort(frequencies, kind='stable')[::-1][:n]
+        return [(self.vocabulary[i], int(frequencies[i])) for i in order if frequencies[i]]
+
+
+def score_corpus(tokenizer, texts):
+    """
+    Scores many conversations at once. A Vocabulary interns and normalizes each distinct token only
+    once and gives every document an array of token ids; per-document category counts and corpus-wide
+    frequencies are then computed with vectorized lookups and bincount over those arrays instead of
+    per-token Python loops.
+    """
+    token_vocabulary = Vocabulary(tokenizer)
+    document_ids = []
+    lengths = []
+    performance = []
+    for text in texts:
+        text = text.lower()
+        ids = token_vocabulary.intern_all(TOKEN_PATTERN.findall(text))
+        document_ids.append(np.frombuffer(ids, dtype=np.uintc))
+        lengths.append(len(ids))
+        performance.append(len(tokenizer.performance_matcher.first_matches(text)))
+    document_count = len(lengths)
+    token_count = len(token_vocabulary)
+
+    # Token id -> normalized word id -> category code
+    normalized_of_token = np.frombuffer(token_vocabulary.normalized_ids, dtype=np.uintc)
+    vocabulary = token_vocabulary.normalized_words
+    categories = np.fromiter(
+        (CATEGORY_CODES.get(tokenizer.classify(word), UNDEFINED_CODE) for word in vocabulary),
+        dtype=np.int64, count=len(vocabulary))
+
+    tokens = np.concatenate(document_ids).astype(np.int64) if document_ids else np.zeros(0, dtype=np.int64)
+    documents = np.repeat(np.arange(document_count, dtype=np.int64), lengths)
+    words = normalized_of_token[tokens]
+    codes = categories[words]
+
+    category_count = UNDEFINED_CODE + 1
+    counts = np.bincount(documents * category_count + codes, minlength=document_count * category_count)
+    counts = counts.reshape(document_count, category_count)
+
+    # Distinct undefined tokens per document, like len(non_defined_words)
+    undefined = codes == UNDEFINED_CODE
+    undefined_pairs = np.unique(documents[undefined] * token_count + tokens[undefined])
+    undefined_words = np.bincount(undefined_pairs // max(token_count, 1), minlength=document_count)
+
+    term_frequencies = np.bincount(words, minlength=len(vocabulary))
+    document_words = np.unique(documents * len(vocabulary) + words)
+    document_frequencies = np.bincount(document_words % max(len(vocabulary), 1), minlength=len(vocabulary))
+
+    return CorpusScores(vocabulary, term_frequencies, document_frequencies, categories, counts, undefined_words,
+                        np.asarray(performance, dtype=np.int64))
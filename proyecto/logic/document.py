@@ -0,0 +1,62 @@
+from array import array
+from collections import Counter
+
+from logic.scoring import EvaluationResults
+from utils import log_message
+
+
+class ScoredDocument:
+    """
+    A tokenized and evaluated conversation that can be updated incrementally.
+    The text is tokenized once into a TokenArray; the same tokens feed the evaluation, the undefined
+    words and the GUI highlighting (through the token indices of each normalized word in occurrences).
+    Keeps how many times each normalized word occurs and which original tokens produced it,
+    so when a word changes category only that word's counts are adjusted.
+    """
+
+    def __init__(self, tokenizer, text, vocabulary=None):
+        self.tokenizer = tokenizer
+        self.text = text
+        self.tokens = tokenizer.tokenize_compact(text, vocabulary)
+        self.term_counts = Counter()
+        self.originals = {}
+        self.occurrences = {}
+        for index, (token, normalized_token) in enumerate(self.tokens):
+            self.term_counts[normalized_token] += 1
+            self.originals.setdefault(normalized_token, {})[token] = None
+            self.occurrences.setdefault(normalized_token, array('I')).append(index)
+        self.categories = {word: tokenizer.classify(word) for word in self.term_counts}
+        self.counts, self.non_defined_words = tokenizer.classify_tokens(self.tokens)
+        # The criteria do not depend on the lexicon, so the score survives reclassification
+        self.performance_score = tokenizer.evaluate_performance(text)
+
+    def reclassify(self, normalized_word):
+        # Re-reads the category of one word from the tokenizer; returns True if anything changed
+        if normalized_word not in self.categories:
+            return False
+        old_category = self.categories[normalized_word]
+        new_category = self.tokenizer.classify(normalized_word)
+        if old_category == new_category:
+            return False
+
+        occurrences = self.term_counts[normalized_word]
+        self.counts[old_category or 'undefined'] -= occurrences
+        self.counts[new_category or 'undefined'] += occurrences
+        self.categories[normalized_word] = new_category
+
+        for token in self.originals[normalized_word]:
+            if new_category is None:
+                self.non_defined_words[token] = normalized_word
+            else:
+                self.non_defined_words.pop(token, None)
+        log_message("Reclassified '%s' from %s to %s (%d occurrences)", normalized_word, old_category, new_category, occurrences)
+        return True
+
+    def positions(self, normalized_word):
+        # (start, end) character offsets of every occurrence of a normalized word
+        starts, ends = self.tokens.starts, self.tokens.ends
+        return [(starts[index], ends[index]) for index in self.occurrences.get(normalized_word, ())]
+
+    def evaluation_results(self):
+        # Same values as scoring.evaluate_text
+        return EvaluationResults.from_counts(self.counts, len(self.non_defined_words), self.performance_score)
@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+from contextlib import contextmanager
+
+from utils import log_message
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Category names used by Tokenizer and their keys in tokens.json
+JSON_KEYS = {'positive': 'BUENAS', 'negative': 'MALAS', 'neutral': 'NEUTRAS'}
+
+# Compact the journal into the snapshot once it grows past this size
+DEFAULT_COMPACT_BYTES = 256 * 1024
+
+
+@contextmanager
+def _file_lock(lock_path, shared=False):
+    # Advisory lock shared by every process using the same tokens.json
+    try:
+        lock_file = open(lock_path, 'a+b')
+    except OSError as e:
+        if not shared:
+            raise
+        # A read-only lexicon directory must not stop a read. Snapshots are replaced atomically and torn
+        # journal lines are skipped, so reading unlocked can at worst miss entries being compacted
+        log_message("Reading without the lock %s: %s", lock_path, e, level=logging.WARNING)
+        lock_file = None
+    if lock_file is None:
+        yield
+        return
+    with lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_atomically(path, data):
+    # Writes to a temporary file in the same directory, then renames it over path. The temporary file is
+    # created owner-only, so it takes the permissions of the file it replaces before the rename
+    import shutil
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tokens-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _categories_of(words):
+    # {word: category} of the {category: [words]} lists; a word listed twice keeps its first category
+    categories = {}
+    for category in JSON_KEYS:
+        for word in words.get(category, ()):
+            categories.setdefault(word, category)
+    return categories
+
+
+def _apply_entry(words, members, word, category):
+    # Puts word in category, taking it out of the others; idempotent so replaying twice is harmless.
+    # members mirrors words as sets so replaying a long journal does not scan the lists.
+    for other, other_words in words.items():
+        if other != category and word in members[other]:
+            other_words[:] = [w for w in other_words if w != word]
+            members[other].discard(word)
+    if word not in members[category]:
+        words[category].append(word)
+        members[category].add(word)
+
+
+class LexiconStore:
+    """
+    tokens.json as a snapshot plus an append-only journal (tokens.json.journal, one JSON entry per line).
+    Classifying a word appends one line instead of rewriting the whole file; the journal is folded
+    into the snapshot (written to a temporary file and atomically renamed) once it grows large.
+    All reads and writes hold a lock file so several GUI or CLI processes can share the lexicon.
+    """
+
+    def __init__(self, path, compact_bytes=DEFAULT_COMPACT_BYTES):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.lock_path = path + '.lock'
+        self.compact_bytes = compact_bytes
+        # {word: category} of the lists last loaded or written by this store, so replace can tell
+        # the words other processes classified since then; None until then
+        self.base = None
+
+    def track(self, words):
+        # Records words as the lists this process works from, when they were not read with load()
+        self.base = _categories_of(words)
+
+    def signature(self):
+        # Identity of the snapshot and the journal on disk; changes whenever either is written.
+        # Take it before load, so a change in between makes it stale rather than wrong.
+        signature = []
+        for path in (self.path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def load(self):
+        # Returns {'positive': [...], 'negative': [...], 'neutral': [...]} with the journal applied
+        with _file_lock(self.lock_path, shared=True):
+            words = self._read()
+        self.track(words)
+        return words
+
+    def _read(self):
+        with open(self.path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        words = {category: list(data[key]) for category, key in JSON_KEYS.items()}
+        members = {category: set(category_words) for category, category_words in words.items()}
+        for word, category in self._read_journal():
+            _apply_entry(words, members, word, category)
+        return words
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash mid-append can only leave a torn last line
+                    log_message("Skipping corrupt journal line in %s", self.journal_path, level=logging.WARNING)
+                    continue
+                if entry.get('category') in JSON_KEYS:
+                    yield entry['word'], entry['category']
+
+    def set_category(self, word, category):
+        # Records that word belongs to category (adding it, or moving it from another one)
+        if category not in JSON_KEYS:
+            raise ValueError(f"Unknown category: {category}")
+        line = (json.dumps({'word': word, 'category': category}, ensure_ascii=False) + '\n').encode('utf-8')
+        with _file_lock(self.lock_path):
+            with open(self.journal_path, 'a+b') as journal:
+                # Start on a fresh line if a previous crash left a torn one
+                if journal.seek(0, os.SEEK_END) > 0:
+                    journal.seek(-1, os.SEEK_END)
+                    if journal.read(1) != b'\n':
+                        line = b'\n' + line
+                journal.write(line)
+                journal.flush()
+                os.fsync(journal.fileno())
+                journal_size = journal.tell()
+            if journal_size >= self.compact_bytes:
+                self._compact()
+        if self.base is not None:
+            self.base[word] = category
+        log_message("Journaled word '%s' as %s", word, category)
+
+    def replace(self, words):
+        """
+        Replaces every list at once (the "Update Tokens" dialog) and returns the lists written.
+        Words whose category on disk changed since this store loaded them, i.e. that another
+        process classified or removed meanwhile, keep the category on disk; the rest come from words.
+        """
+        with _file_lock(self.lock_path):
+            current = _categories_of(self._read())
+            base = self.base if self.base is not None else current
+            merged = {category: [word for word in category_words if current.get(word) == base.get(word)]
+                      for category, category_words in words.items()}
+            members = {category: set(category_words) for category, category_words in merged.items()}
+            # In the order of the lists on disk, then the words removed from them
+            for word in list(current) + [word for word in base if word not in current]:
+                if current.get(word) != base.get(word):
+                    if current.get(word) is not None:
+                        _apply_entry(merged, members, word, current[word])
+                    log_message("Keeping '%s' as %s, changed by another process", word, current.get(word))
+            # Snapshot first: a failure before the truncation leaves the journal to be replayed
+            self._write_snapshot(merged)
+            self._truncate_journal()
+        self.track(merged)
+        return merged
+
+    def compact(self):
+        with _file_lock(self.lock_path):
+            self._compact()
+
+    def _compact(self):
+        if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+            return
+        # Rebuilt from disk, not from memory, so entries appended by other processes are kept
+        self._write_snapshot(self._read())
+        # Entries are idempotent, so a crash before this truncation only replays them again
+        self._truncate_journal()
+        log_message("Compacted lexicon journal into %s", self.path)
+
+    def _write_snapshot(self, words):
+        with open(self.path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        for category, key in JSON_KEYS.items():
+            data[key] = list(words[category])
+        write_atomically(self.path, json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8'))
+
+    def _truncate_journal(self):
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'wb') as journal:
+                os.fsync(journal.fileno())
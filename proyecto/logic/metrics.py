@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+from utils import log_message
+
+METRICS_ENV = 'TOKENIZER_METRICS'
+
+# Upper bounds in seconds of the stage histogram buckets, plus an implicit +Inf bucket
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+PROMETHEUS_PREFIX = 'proyecto'
+
+# Returned by timed() while metrics are disabled, so an instrumented stage costs one call
+_DISABLED = nullcontext()
+
+# Registry the hooks record into; None until enable() is called
+_active = None
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """
+    Time histograms per stage (read, tokenize, normalize, lexicon, phrases, output, ...) and
+    counters (conversations, tokens, ...) of one run. Safe to record into from several threads.
+    Worker processes record into their own registry and send snapshot()s back to be merge()d.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {stage: {"count", "sum", "max", "buckets": [occurrences per bucket, +Inf last]}}
+        self.stages = {}
+        self.counters = {}
+
+    def time(self, stage):
+        return _StageTimer(self, stage)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+            histogram["buckets"][bisect_left(BUCKETS, seconds)] += 1
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self, reset=False):
+        # Plain dicts that can be pickled to the parent process or dumped as JSON
+        with self._lock:
+            snapshot = {
+                "stages": {stage: dict(histogram, buckets=list(histogram["buckets"])) for stage, histogram in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+            if reset:
+                self.stages = {}
+                self.counters = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        with self._lock:
+            for stage, other in snapshot["stages"].items():
+                histogram = self.stages.get(stage)
+                if histogram is None:
+                    self.stages[stage] = dict(other, buckets=list(other["buckets"]))
+                    continue
+                histogram["count"] += other["count"]
+                histogram["sum"] += other["sum"]
+                histogram["max"] = max(histogram["max"], other["max"])
+                histogram["buckets"] = [a + b for a, b in zip(histogram["buckets"], other["buckets"])]
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        # Like snapshot, with the mean of every stage and cumulative buckets keyed by upper bound
+        snapshot = self.snapshot()
+        stages = {}
+        for stage, histogram in sorted(snapshot["stages"].items()):
+            cumulative = 0
+            buckets = {}
+            for bound, occurrences in zip(BUCKETS + (float('inf'),), histogram["buckets"]):
+                cumulative += occurrences
+                buckets[_bucket_label(bound)] = cumulative
+            stages[stage] = {
+                "count": histogram["count"],
+                "sum": histogram["sum"],
+                "mean": histogram["sum"] / histogram["count"],
+                "max": histogram["max"],
+                "buckets": buckets,
+            }
+        return {"stages": stages, "counters": dict(sorted(snapshot["counters"].items()))}
+
+    def to_prometheus(self):
+        # Prometheus text exposition format
+        data = self.to_dict()
+        name = f"{PROMETHEUS_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each scoring stage.", f"# TYPE {name} histogram"]
+        for stage, histogram in data["stages"].items():
+            for bound, cumulative in histogram["buckets"].items():
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum"]!r}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+        for counter, value in data["counters"].items():
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{counter}_total counter")
+            lines.append(f"{PROMETHEUS_PREFIX}_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # JSON for a .json path, Prometheus text (e.g. for the node exporter textfile collector) otherwise
+        if path.endswith('.json'):
+            content = json.dumps(self.to_dict(), indent=4)
+        else:
+            content = self.to_prometheus()
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        log_message("Metrics written: %s", path)
+
+
+def _bucket_label(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def enable():
+    # Starts recording the hooks of this process into a new registry, which is returned
+    global _active
+    _active = Metrics()
+    return _active
+
+
+def disable():
+    global _active
+    _active = None
+
+
+def active():
+    return _active
+
+
+def enable_from_environment():
+    # Entry points without a --metrics option (the GUI) opt in with TOKENIZER_METRICS=<output file>
+    path = os.environ.get(METRICS_ENV)
+    if path:
+        enable()
+    return path
+
+
+def timed(stage):
+    # with timed('tokenize'): ... records the duration of the block while metrics are enabled
+    metrics = _active
+    return _DISABLED if metrics is None else metrics.time(stage)
+
+
+def observe(stage, seconds):
+    # For durations measured across callbacks, where a with block does not fit
+    metrics = _active
+    if metrics is not None:
+        metrics.observe(stage, seconds)
+
+
+def count(name, value=1):
+    metrics = _active
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def drain():
+    # Snapshot of a worker's registry since the previous drain, for the parent to merge
+    return _active.snapshot(reset=True) if _active is not None else None
+
+
+def merge(snapshot):
+    if _active is not None and snapshot is not None:
+        _active.merge(snapshot)
+
+
+@contextmanager
+def profiled(path):
+    # cProfile capture of the block, saved for pstats / snakeviz; profiling is imported only when used
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        log_message("Profile written: %s", path)
@@ -0,0 +1,162 @@
+import functools
+import os
+
+NORMALIZER_ENV = 'TOKENIZER_NORMALIZER'
+DEFAULT_NORMALIZER = 'spanish'
+
+# Special token for numbers
+NUMBER_TOKEN = 'neutral_number'
+
+ACCENTS = str.maketrans('áéíóúüàèìòù', 'aeiouuaeiou')
+
+VOWELS = 'aeiouáéíóú'
+
+PRONOUNS = ('lo', 'la', 'le', 'los', 'las', 'les', 'me', 'te', 'se', 'nos')
+
+
+def _spanish_suffix_stages():
+    # Rules as (suffix, replacement, shortest stem left in front of the suffix); each stage applies
+    # at most its longest matching rule, once, in this order.
+    inflection = []
+    # Plurals: vowel + ces comes from z (veces -> vez), -es after a vowel + l, r, n, d or y from a word
+    # ending in that consonant (papeles -> papel, razones -> razon), -eses/-ises from a final s (meses -> mes)
+    for vowel in VOWELS:
+        inflection.append((vowel + 'ces', vowel + 'z', 1))
+        for consonant in 'lrndy':
+            inflection.append((vowel + consonant + 'es', vowel + consonant, 1))
+    inflection += [('eses', 'es', 1), ('ises', 'is', 1), ('íses', 'ís', 1)]
+    # Vowel + s (los -> lo, dias -> dia); -es needs a longer stem so that mes, tres or pues stay as they are
+    inflection += [('as', 'a', 1), ('os', 'o', 1), ('es', 'e', 3)]
+    # Pronouns attached to infinitives and gerunds (verificarlo -> verificar, diciéndole -> diciendo)
+    for base, bare in (('ar', 'ar'), ('er', 'er'), ('ir', 'ir'), ('ando', 'ando'), ('iendo', 'iendo'),
+                       ('ándo', 'ando'), ('iéndo', 'iendo')):
+        inflection += [(base + pronoun, bare, 3) for pronoun in PRONOUNS]
+
+    # Verb endings, matched before accents are removed: the accent tells the future and the preterite
+    # (esperará, esperó) from the present (espera, espero), which the final vowel stage handles.
+    # Endings in -mos are left alone: the plural rule takes them first, as it must for préstamos or últimos
+    verb_endings = ('ar', 'er', 'ir', 'ando', 'iendo', 'yendo', 'ado', 'ada', 'ido', 'ida', 'áis', 'éis', 'an', 'en',
+                    'é', 'ó', 'ió', 'aste', 'iste', 'aron', 'ieron', 'aba', 'aban', 'ía', 'ían',
+                    'ará', 'arán', 'erá', 'erán', 'irá', 'irán', 'aría', 'arían', 'ería', 'erían', 'iría', 'irían')
+    # Adverbs and superlatives (nuevamente -> nueva, muchísimo -> much)
+    derivation = [(ending, '', 3) for ending in verb_endings + ('mente', 'ísimo', 'ísima', 'isimo', 'isima')]
+    # The future -aré of revisar is also the preterite -é of esperar or declarar: a longer stem favours the latter
+    derivation += [('aré', '', 4), ('eré', '', 4), ('iré', '', 4)]
+
+    # Final vowels, so gender and the person of the verb collapse (buena, bueno -> buen; reviso -> revis)
+    final_vowel = [('a', '', 3), ('o', '', 3), ('e', '', 3)]
+
+    # Diminutives, once their vowel is gone (momentit -> moment, poquit -> poc, cafecit -> caf). -itar
+    # verbs lose the same it, so necesito, necesita and necesitar still agree
+    diminutive = [('it', '', 3), ('cit', '', 3), ('ecit', '', 3), ('quit', 'c', 2), ('guit', 'g', 2), ('ill', '', 4)]
+
+    return tuple(tuple(stage) for stage in (inflection, derivation, final_vowel, diminutive))
+
+
+# Stages before and after accents are removed
+SPANISH_SUFFIX_STAGES = _spanish_suffix_stages()
+ACCENTED_STAGES = 2
+
+
+class SuffixTrie:
+    """
+    Suffix rules indexed by their characters from last to first, so the longest rule matching a
+    word is found in one walk from the end of the word, whatever the number of rules.
+    """
+
+    __slots__ = ('root',)
+
+    def __init__(self, rules):
+        self.root = {}
+        for suffix, replacement, min_stem in rules:
+            node = self.root
+            for char in reversed(suffix):
+                node = node.setdefault(char, {})
+            # The None key of a node holds the rule of the suffix spelled by the path to it
+            node[None] = (len(suffix), replacement, min_stem)
+
+    def longest_match(self, word):
+        # (suffix length, replacement, min_stem) of the longest rule leaving a long enough stem, or None
+        node = self.root
+        match = None
+        stem = len(word)
+        for char in reversed(word):
+            node = node.get(char)
+            if node is None:
+                break
+            stem -= 1
+            rule = node.get(None)
+            if rule is not None and stem >= rule[2]:
+                match = rule
+        return match
+
+
+@functools.lru_cache(maxsize=None)
+def compile_stages(stages):
+    # Tries are built once per rule set and shared by every normalizer using it
+    return tuple(SuffixTrie(rules) for rules in stages)
+
+
+class LegacyNormalizer:
+    # The original rules: drop a final s, then turn a final a into o. Kept to reproduce older results
+    name = 'legacy'
+    version = 1
+
+    def normalize(self, word):
+        updated_word = word.lower()
+        if updated_word.isdigit():
+            return NUMBER_TOKEN
+        if updated_word.endswith('s'):
+            updated_word = updated_word[:-1]  # Remove plural 's'
+        if updated_word.endswith('a'):
+            updated_word = updated_word[:-1] + 'o'  # Convert feminine to masculine
+        return updated_word
+
+
+class SpanishNormalizer:
+    """
+    Rule-based Spanish normalization of the words of the text and of the lexicon. Lowercases, then
+    applies the longest matching suffix rule of each stage once: plurals and attached pronouns,
+    verb endings, adverbs and superlatives, then, without accents, final vowels and diminutives.
+    Each stage is a SuffixTrie, so a word costs one short walk per stage.
+    Like a stemmer, it maps words to stems and is not meant to be applied to its own output.
+    """
+
+    name = 'spanish'
+    version = 1
+
+    def __init__(self, stages=SPANISH_SUFFIX_STAGES, accented_stages=ACCENTED_STAGES):
+        self.stages = compile_stages(stages)
+        self.accented_stages = accented_stages
+
+    def normalize(self, word):
+        word = word.lower()
+        if word.isdigit() or word == NUMBER_TOKEN:
+            return NUMBER_TOKEN
+        for index, stage in enumerate(self.stages):
+            if index == self.accented_stages and not word.isascii():
+                word = word.translate(ACCENTS)
+            rule = stage.longest_match(word)
+            if rule is not None:
+                length, replacement, _ = rule
+                word = word[:-length] + replacement
+        return word
+
+
+NORMALIZERS = {'spanish': SpanishNormalizer, 'legacy': LegacyNormalizer}
+
+
+def get_normalizer(normalizer=None):
+    # A normalizer instance from a name in NORMALIZERS or an object with name, version and normalize(word).
+    # None picks the TOKENIZER_NORMALIZER environment variable, then DEFAULT_NORMALIZER
+    if normalizer is None:
+        normalizer = os.environ.get(NORMALIZER_ENV, DEFAULT_NORMALIZER)
+    if isinstance(normalizer, str):
+        if normalizer not in NORMALIZERS:
+            raise ValueError(f"Unknown normalizer: {normalizer}")
+        return NORMALIZERS[normalizer]()
+    return normalizer
+
+
+def normalizer_fingerprint(normalizer):
+    return f"{normalizer.name}:{normalizer.version}"
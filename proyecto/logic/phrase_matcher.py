@@ -0,0 +1,115 @@
+from collections import deque
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over a dictionary of {key: [phrases]}.
+    Finds every phrase of every key in a single pass over the text.
+    Phrases are lowercased when compiled, so the text to scan must be lowercased too.
+    """
+
+    def __init__(self, phrases_by_key):
+        self.keys = list(phrases_by_key)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for key, phrases in phrases_by_key.items():
+            for phrase in phrases:
+                self._add_phrase(key, phrase.lower())
+        self._build_failure_links()
+
+    def tables(self):
+        # The compiled automaton as plain lists, tuples and dicts (marshal-able); see from_tables
+        return self.keys, self._goto, self._fail, self._output
+
+    @classmethod
+    def from_tables(cls, tables):
+        matcher = cls.__new__(cls)
+        keys, goto, fail, output = tables
+        matcher.keys = list(keys)
+        matcher._goto = goto
+        matcher._fail = fail
+        matcher._output = output
+        return matcher
+
+    def _add_phrase(self, key, phrase):
+        if not phrase:
+            return
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] += ((key, phrase),)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                # Inherit the matches of the longest proper suffix
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        # Yields (key, phrase, start, end) for every occurrence, in order of end position
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                end = position + 1
+                for key, phrase in output[state]:
+                    yield key, phrase, end - len(phrase), end
+
+    def first_matches(self, text):
+        # Returns {key: (phrase, start, end)} with the first occurrence of each key
+        matches = {}
+        for key, phrase, start, end in self.iter_matches(text):
+            if key not in matches:
+                matches[key] = (phrase, start, end)
+                if len(matches) == len(self.keys):
+                    break
+        return matches
+
+
+class PhraseStream:
+    """
+    Incremental scan with a PhraseMatcher: feed the lowercased text in consecutive chunks
+    and phrases spanning chunk boundaries are still found. Keeps only the automaton state
+    and the first match of each key, so memory does not grow with the input.
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.state = 0
+        self.offset = 0
+        self.matches = {}
+
+    def feed(self, text):
+        goto, fail, output = self.matcher._goto, self.matcher._fail, self.matcher._output
+        matches = self.matches
+        state = self.state
+        for position, char in enumerate(text, start=self.offset):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                end = position + 1
+                for key, phrase in output[state]:
+                    if key not in matches:
+                        matches[key] = (phrase, end - len(phrase), end)
+        self.state = state
+        self.offset += len(text)
+        return matches
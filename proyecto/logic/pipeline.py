@@ -0,0 +1,230 @@
+import asyncio
+import functools
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from logic import metrics
+from logic.result_cache import ResultCache
+from logic.scoring import StreamingScorer, score_text
+from logic.tokenizer import Tokenizer
+from logic.worker import call_with_metrics, init_worker, worker_tokenizer
+from utils import log_message
+
+DEFAULT_READERS = 16
+DEFAULT_QUEUE_SIZE = 64
+
+# Files up to this many characters are read whole by the read stage; the rest of larger ones is streamed by the score stage
+PREREAD_CHARS = 64 * 1024
+
+# ATC_000.txt, EXP_012.txt, ... as written by Examples.generate_txt_files_from_json
+_CONVERSATION_FILE = re.compile(r'^(ATC|EXP)_(\d+)$')
+
+
+def conversation_id(file_path):
+    # Stable id of a transcript: ATC_/EXP_ file names keep their zero-padded number, other files their stem
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    match = _CONVERSATION_FILE.match(stem)
+    if match:
+        return f"{match.group(1)}_{int(match.group(2)):03d}"
+    return stem
+
+
+def _score(tokenizer, file_path, text, position=None, keep_counts=False):
+    # text is a whole conversation or, with position, the first characters of file_path, which is streamed
+    # on from position. Returns (results, counts); with keep_counts, counts are the token counts and
+    # performance score a ResultCache stores, otherwise None
+    with metrics.timed('score'):
+        if position is None and not keep_counts:
+            return dict(score_text(tokenizer, text)), None
+        scorer = StreamingScorer(tokenizer)
+        scorer.feed(text)
+        if position is not None:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                file.seek(position)
+                scorer.feed_stream(file)
+        results = dict(scorer.close())
+    if not keep_counts:
+        return results, None
+    return results, (scorer.token_counts, scorer.performance_score)
+
+
+def _score_in_worker(file_path, text, position, keep_counts):
+    return _score(worker_tokenizer(), file_path, text, position, keep_counts)
+
+
+def _read_prefix(file_path):
+    # (text, None) for a file of at most PREREAD_CHARS characters. For a larger one, its first characters and
+    # the position after them, where the score stage goes on reading, so the queues never hold more than
+    # that per conversation whatever the size of the transcripts
+    with metrics.timed('read'):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            text = file.read(PREREAD_CHARS + 1)
+            position = file.tell() if len(text) > PREREAD_CHARS else None
+    metrics.count('characters_read', len(text))
+    return text, position
+
+
+async def run_pipeline(tasks, write, tokenizer=None, tokens_path=None, workers=None, readers=DEFAULT_READERS,
+                       queue_size=DEFAULT_QUEUE_SIZE, cancel_event=None, progress=None, log_level=logging.WARNING,
+                       cache_path=None):
+    """
+    Scores (conversation_id, file_path, text) tasks, like the ones of cli.iter_tasks, in four stages
+    connected by bounded queues: discover (pulls tasks from the iterable), read (readers concurrent
+    file reads for tasks without text), score (CPU-bound, in an executor) and write.
+    A full queue blocks the stage feeding it, so slow scoring holds back reading instead of
+    letting texts pile up in memory. The read stage reads at most PREREAD_CHARS characters of a file;
+    the score stage starts from those and streams the rest of larger files, so memory stays bounded.
+    Results are passed to write in completion order, shaped like the CLI output:
+    {"id", "file", <evaluate_text fields>} or {"id", "file", "error"}.
+
+    With cache_path, files are looked up in that ResultCache by the read stage, so unchanged files are
+    neither read nor scored, and the results of the others are stored by the write stage.
+
+    With workers=0 scoring uses tokenizer in a thread; otherwise a process pool of workers
+    (default: CPU count) loads tokens_path (default: the tokenizer's tokens.json) once per process.
+    Blocking calls (iterating tasks, reading files) run in a thread pool so the event loop never
+    waits on a slow mount. Returns (scored, failed).
+    """
+    loop = asyncio.get_running_loop()
+    collect_metrics = False
+    if workers == 0:
+        if tokenizer is None:
+            tokenizer = Tokenizer.from_json(tokens_path)
+        score_executor = ThreadPoolExecutor(max_workers=1)
+        score_function = lambda *task: _score(tokenizer, *task)  # noqa: E731
+        scorers = 1
+    else:
+        if tokens_path is None:
+            tokens_path = tokenizer.lexicon_store.path
+        if tokenizer is None and cache_path is not None:
+            # Cache keys need the fingerprints of the lexicon the workers load
+            tokenizer = Tokenizer.from_json(tokens_path)
+        workers = workers or os.cpu_count()
+        # Worker processes record into their own registry, merged here after every text
+        collect_metrics = metrics.active() is not None
+        score_executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(tokens_path, log_level, collect_metrics))
+        score_function = functools.partial(call_with_metrics, _score_in_worker) if collect_metrics else _score_in_worker
+        # One extra text per process waiting in the executor keeps every process busy
+        scorers = workers * 2
+    io_executor = ThreadPoolExecutor(max_workers=readers + 1)
+    cache = ResultCache(cache_path) if cache_path is not None else None
+
+    to_read = asyncio.Queue(maxsize=queue_size)
+    to_score = asyncio.Queue(maxsize=scorers)
+    to_write = asyncio.Queue(maxsize=queue_size)
+    counts = {'discovered': 0, 'done': 0, 'failed': 0}
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    async def discover():
+        iterator = iter(tasks)
+        while not cancelled():
+            task = await loop.run_in_executor(io_executor, next, iterator, None)
+            if task is None:
+                break
+            counts['discovered'] += 1
+            await to_read.put(task)
+
+    async def read():
+        while True:
+            task = await to_read.get()
+            if task is None:
+                return
+            if cancelled():
+                continue
+            task_id, file_path, text = task
+            position = None
+            key = None
+            if text is None:
+                try:
+                    if cache is not None:
+                        key, results = await loop.run_in_executor(io_executor, cache.lookup, tokenizer, file_path)
+                        if results is not None:
+                            await to_write.put(({"id": task_id, "file": file_path, **results}, None))
+                            continue
+                    text, position = await loop.run_in_executor(io_executor, _read_prefix, file_path)
+                except Exception as e:
+                    log_message("Failed to read %s: %s", file_path, e, level=logging.ERROR)
+                    metrics.count('errors')
+                    await to_write.put(({"id": task_id, "file": file_path, "error": str(e)}, None))
+                    continue
+            await to_score.put((task_id, file_path, text, position, key))
+
+    async def score():
+        while True:
+            task = await to_score.get()
+            if task is None:
+                return
+            task_id, file_path, text, position, key = task
+            result = {"id": task_id, "file": file_path}
+            stored = None
+            try:
+                scored = await loop.run_in_executor(score_executor, score_function, file_path, text, position, key is not None)
+                if collect_metrics:
+                    scored, snapshot = scored
+                    metrics.merge(snapshot)
+                results, score_counts = scored
+                result.update(results)
+                if key is not None:
+                    stored = (key, results, *score_counts)
+            except Exception as e:
+                log_message("Failed to score %s: %s", task_id, e, level=logging.ERROR)
+                metrics.count('errors')
+                result["error"] = str(e)
+            await to_write.put((result, stored))
+
+    async def write_results():
+        while True:
+            item = await to_write.get()
+            if item is None:
+                return
+            result, stored = item
+            if stored is not None:
+                try:
+                    await loop.run_in_executor(io_executor, cache.store, *stored)
+                except Exception as e:
+                    log_message("Failed to cache the results of %s: %s", result["file"], e, level=logging.ERROR)
+            write(result)
+            counts['done'] += 1
+            counts['failed'] += "error" in result
+            if progress:
+                progress(counts['done'], counts['discovered'])
+
+    async def close_after(stage_tasks, queue, sentinels):
+        # Once every task of a stage is done, tell each consumer of its output queue to stop
+        await asyncio.gather(*stage_tasks)
+        for _ in range(sentinels):
+            await queue.put(None)
+
+    discover_tasks = [asyncio.ensure_future(discover())]
+    read_tasks = [asyncio.ensure_future(read()) for _ in range(readers)]
+    scoring_tasks = [asyncio.ensure_future(score()) for _ in range(scorers)]
+    writer = asyncio.ensure_future(write_results())
+    stages = [
+        close_after(discover_tasks, to_read, readers),
+        close_after(read_tasks, to_score, scorers),
+        close_after(scoring_tasks, to_write, 1),
+        writer,
+    ]
+    try:
+        await asyncio.gather(*stages)
+    finally:
+        for task in discover_tasks + read_tasks + scoring_tasks + [writer]:
+            task.cancel()
+        io_executor.shutdown(wait=False, cancel_futures=True)
+        score_executor.shutdown(wait=True, cancel_futures=True)
+        if cache is not None:
+            log_message("Result cache: %s", dict(cache.stats), level=logging.INFO)
+            cache.close()
+    log_message("Pipeline scored %d conversations (%d failed)", counts['done'], counts['failed'], level=logging.INFO)
+    return counts['done'], counts['failed']
+
+
+def score_tasks(tasks, tokenizer=None, tokens_path=None, workers=None, **kwargs):
+    # Blocking wrapper around run_pipeline; returns the results in completion order
+    results = []
+    asyncio.run(run_pipeline(tasks, results.append, tokenizer, tokens_path, workers, **kwargs))
+    return results
@@ -0,0 +1,186 @@
+import json
+import math
+from collections import Counter
+
+from logic import metrics
+from logic.scoring import RESULT_FIELDS
+from utils import log_message
+
+# Conversation groups compared in the summary, from the ATC_/EXP_ prefix of the file names
+GROUPS = ('ATC', 'EXP')
+
+PERCENTILES = (10, 50, 90, 99)
+
+# Histograms never have more bars than this, whatever the spread of the scores
+MAX_HISTOGRAM_BINS = 40
+
+
+def conversation_group(name):
+    prefix = name.split('_', 1)[0]
+    return prefix if prefix in GROUPS else 'other'
+
+
+def _percentile(values, total, percentile):
+    # Nearest-rank percentile of a {value: occurrences} Counter holding total occurrences
+    rank = max(math.ceil(percentile / 100 * total), 1)
+    seen = 0
+    for value in sorted(values):
+        seen += values[value]
+        if seen >= rank:
+            return value
+    return None
+
+
+class ReportSummary:
+    """
+    Running aggregate of the report results. Scores are small integers, so each field of each
+    group keeps a Counter of its values: memory and the cost of every statistic depend on the
+    number of distinct scores, not on the number of files.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.errors = 0
+        # {group: {field: Counter({value: files})}}, with 'all' for every file
+        self.values = {}
+
+    def add(self, name, results):
+        self.files += 1
+        for group in ('all', conversation_group(name)):
+            fields = self.values.setdefault(group, {field: Counter() for field in RESULT_FIELDS})
+            for field in RESULT_FIELDS:
+                fields[field][results[field]] += 1
+
+    def add_error(self):
+        self.errors += 1
+
+    def groups(self):
+        return [group for group in ('all',) + GROUPS + ('other',) if group in self.values]
+
+    def statistics(self, group, field):
+        values = self.values.get(group, {}).get(field)
+        total = sum(values.values()) if values else 0
+        if not total:
+            return {"count": 0}
+        statistics = {
+            "count": total,
+            "mean": sum(value * occurrences for value, occurrences in values.items()) / total,
+            "min": min(values),
+            "max": max(values),
+        }
+        for percentile in PERCENTILES:
+            statistics[f"p{percentile}"] = _percentile(values, total, percentile)
+        return statistics
+
+    def histogram(self, group, field, max_bins=MAX_HISTOGRAM_BINS):
+        # ([bin start, ...], [files, ...]); bins are one score wide unless that would exceed max_bins
+        values = self.values.get(group, {}).get(field)
+        if not values:
+            return [], []
+        low, high = min(values), max(values)
+        width = max(math.ceil((high - low + 1) / max_bins), 1)
+        starts = list(range(low, high + 1, width))
+        counts = [0] * len(starts)
+        for value, occurrences in values.items():
+            counts[(value - low) // width] += occurrences
+        return starts, counts
+
+    def to_dict(self):
+        return {
+            "files": self.files,
+            "errors": self.errors,
+            "groups": {group: {field: self.statistics(group, field) for field in RESULT_FIELDS} for group in self.groups()},
+        }
+
+    def write(self, summary_file):
+        with open(summary_file, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=4)
+        log_message("Report summary written: %s", summary_file)
+
+
+class ReportWriter:
+    """
+    Writes report.txt one file at a time, flushing after each, so the results scored so far
+    survive a crash or a cancelled report. Keeps only the ReportSummary in memory.
+    """
+
+    def __init__(self, report_file):
+        self.report_file = report_file
+        self.summary = ReportSummary()
+        self._file = open(report_file, 'w', encoding='utf-8')
+
+    def write(self, name, results):
+        # Same layout as the report built in one piece: blocks separated by two blank lines
+        lines = [f"File: {name}"] + [f"{key}: {value}" for key, value in results.items()] + ["\n"]
+        with metrics.timed('output'):
+            if self.summary.files:
+                self._file.write("\n")
+            self._file.write("\n".join(lines))
+            self._file.flush()
+        self.summary.add(name, results)
+
+    def write_error(self, file_path, error):
+        self.summary.add_error()
+        metrics.count('errors')
+        log_message("Report skips %s: %s", file_path, error)
+
+    def close(self, note=None):
+        if note:
+            self._file.write(f"\n{note}\n")
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._file.closed:
+            self.close()
+
+
+def draw_summary_chart(summary, chart_file):
+    """
+    Histograms of the experience and performance scores per group, percentiles of the word counts
+    and ATC vs EXP means, drawn from the summary only. Returns the matplotlib figure.
+    """
+    # Imported on first use; the scoring engine does not need matplotlib
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots(2, 2, figsize=(12, 8))
+    groups = [group for group in GROUPS + ('other',) if group in summary.values] or ['all']
+
+    for axis, field in zip(axes[0], ("Experience Score", "Performance Score")):
+        for index, group in enumerate(groups):
+            starts, counts = summary.histogram(group, field)
+            width = (starts[1] - starts[0]) if len(starts) > 1 else 1
+            offset = width * (index - (len(groups) - 1) / 2) / len(groups)
+            axis.bar([start + offset for start in starts], counts, width=width / len(groups), label=group)
+        axis.set_title(f"{field} distribution")
+        axis.set_xlabel(field)
+        axis.set_ylabel('Files')
+        axis.legend()
+
+    word_fields = ["Positive Words", "Negative Words", "Neutral Words", "Undefined Words"]
+    axis = axes[1][0]
+    for index, percentile in enumerate((10, 50, 90)):
+        values = [summary.statistics('all', field).get(f"p{percentile}") or 0 for field in word_fields]
+        axis.bar([position + (index - 1) * 0.25 for position in range(len(word_fields))], values, width=0.25, label=f"p{percentile}")
+    axis.set_xticks(range(len(word_fields)))
+    axis.set_xticklabels([field.split()[0] for field in word_fields])
+    axis.set_title('Words per file (percentiles)')
+    axis.legend()
+
+    axis = axes[1][1]
+    for index, group in enumerate(groups):
+        means = [summary.statistics(group, field).get("mean") or 0 for field in RESULT_FIELDS]
+        offset = (index - (len(groups) - 1) / 2) * 0.8 / len(groups)
+        axis.bar([position + offset for position in range(len(RESULT_FIELDS))], means, width=0.8 / len(groups), label=group)
+    axis.set_xticks(range(len(RESULT_FIELDS)))
+    axis.set_xticklabels([field.replace(' ', '\n') for field in RESULT_FIELDS], fontsize=8)
+    axis.set_title('Mean per group')
+    axis.legend()
+
+    figure.suptitle(f"Evaluation summary ({summary.files} files)")
+    figure.tight_layout()
+    figure.savefig(chart_file)
+    log_message("Graph generated: %s", chart_file)
+    return figure
@@ -0,0 +1,142 @@
+import codecs
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+
+from logic.scoring import DEFAULT_CHUNK_SIZE, SCORER_VERSION, EvaluationResults, StreamingScorer, results_from_token_counts
+from utils import log_message
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    content_hash TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    token_counts TEXT NOT NULL,
+    performance_score INTEGER NOT NULL,
+    lexicon TEXT NOT NULL,
+    results TEXT NOT NULL,
+    PRIMARY KEY (content_hash, analysis)
+);
+"""
+
+
+def hash_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent SQLite cache of scoring results, keyed by the SHA-256 of the file content,
+    the analysis fingerprint (scorer version, normalizer and criteria) and the lexicon fingerprint.
+
+    Besides the results it stores the lexicon-independent part of the analysis: the occurrences of
+    each (token, normalized) pair and the performance score. When only the lexicon changed, results
+    are recomputed from those counts without reading or tokenizing the file again.
+    A (path, size, mtime) index avoids re-hashing files that have not been touched.
+
+    One cache can be shared by the threads of a process: statements are serialized by a lock, and
+    files are hashed outside it so concurrent lookups overlap their reads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Autocommit + WAL so several worker processes can share one cache file
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def content_hash(self, file_path):
+        stat = os.stat(file_path)
+        path = os.path.abspath(file_path)
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, content_hash FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        content_hash = hash_file(file_path)
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, content_hash))
+        return content_hash
+
+    def lookup(self, tokenizer, file_path):
+        # (key, results): the results of an unchanged file, or None when it has to be scored and its
+        # results stored under key. When only the lexicon changed, the results are recomputed from
+        # the stored token counts without reading the file
+        content_hash = self.content_hash(file_path)
+        analysis = f"{SCORER_VERSION}:{tokenizer.analysis_fingerprint()}"
+        lexicon = tokenizer.lexicon_fingerprint()
+        key = (content_hash, analysis, lexicon)
+
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT token_counts, performance_score, lexicon, results FROM analyses WHERE content_hash = ? AND analysis = ?",
+                (content_hash, analysis)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return key, None
+            token_counts, performance_score, cached_lexicon, results = row
+            if cached_lexicon == lexicon:
+                self.stats['hits'] += 1
+                return key, EvaluationResults.from_dict(json.loads(results))
+            self.stats['rescored'] += 1
+
+        # Same text, different lexicon: only the classification has to be redone
+        token_counts = {(token, normalized): occurrences for token, normalized, occurrences in json.loads(token_counts)}
+        results = results_from_token_counts(tokenizer, token_counts, performance_score)
+        with self._lock:
+            self.connection.execute(
+                "UPDATE analyses SET lexicon = ?, results = ? WHERE content_hash = ? AND analysis = ?",
+                (lexicon, json.dumps(dict(results)), content_hash, analysis))
+        return key, results
+
+    def store(self, key, results, token_counts, performance_score):
+        # Saves the results of a lookup miss with the {(token, normalized): occurrences} they came from
+        content_hash, analysis, lexicon = key
+        token_counts = [[token, normalized, occurrences] for (token, normalized), occurrences in token_counts.items()]
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO analyses (content_hash, analysis, token_counts, performance_score, lexicon, results) VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, analysis, json.dumps(token_counts, ensure_ascii=False), performance_score, lexicon, json.dumps(dict(results))))
+
+    def score_file(self, tokenizer, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        key, results = self.lookup(tokenizer, file_path)
+        if results is not None:
+            return results
+
+        scorer = StreamingScorer(tokenizer)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                scorer.feed(decoder.decode(chunk))
+            scorer.feed(decoder.decode(b'', final=True))
+        results = scorer.close()
+        self.store(key, results, scorer.token_counts, scorer.performance_score)
+        log_message("Cached results of %s (%s)", file_path, key[0])
+        return results
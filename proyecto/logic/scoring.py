@@ -0,0 +1,175 @@
+import re
+from collections import Counter
+from collections.abc import Mapping
+
+from logic import metrics
+from logic.phrase_matcher import PhraseStream
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# Bump whenever a change to tokenization or scoring invalidates previously cached results
+SCORER_VERSION = 1
+
+# Trailing word characters of a chunk may be the start of a word continued in the next chunk
+_TRAILING_WORD = re.compile(r'\w*\Z')
+
+RESULT_FIELDS = ["Undefined Words", "Positive Words", "Negative Words", "Neutral Words", "Experience Score", "Performance Score"]
+
+
+class EvaluationResults(Mapping):
+    """
+    Evaluation of one conversation. A read-only mapping keyed by RESULT_FIELDS, so it is used
+    like the result dicts it replaces (dict(results) for JSON), but holds only five slots.
+    """
+
+    __slots__ = ('undefined_words', 'positive_words', 'negative_words', 'neutral_words', 'performance_score')
+
+    _ATTRIBUTES = dict(zip(RESULT_FIELDS, ('undefined_words', 'positive_words', 'negative_words', 'neutral_words',
+                                           'experience_score', 'performance_score')))
+
+    def __init__(self, undefined_words, positive_words, negative_words, neutral_words, performance_score):
+        self.undefined_words = undefined_words
+        self.positive_words = positive_words
+        self.negative_words = negative_words
+        self.neutral_words = neutral_words
+        self.performance_score = performance_score
+
+    @classmethod
+    def from_counts(cls, counts, undefined_words, performance_score):
+        return cls(undefined_words, counts['positive'], counts['negative'], counts['neutral'], performance_score)
+
+    @classmethod
+    def from_dict(cls, results):
+        # Inverse of dict(results), e.g. for results loaded back from JSON
+        return cls(results["Undefined Words"], results["Positive Words"], results["Negative Words"],
+                   results["Neutral Words"], results["Performance Score"])
+
+    @property
+    def experience_score(self):
+        return self.positive_words - self.negative_words
+
+    def __getitem__(self, field):
+        attribute = self._ATTRIBUTES.get(field)
+        if attribute is None:
+            raise KeyError(field)
+        return getattr(self, attribute)
+
+    def __iter__(self):
+        return iter(RESULT_FIELDS)
+
+    def __len__(self):
+        return len(RESULT_FIELDS)
+
+    def __repr__(self):
+        return f"EvaluationResults({dict(self)})"
+
+
+def evaluate_text(tokens, tokenizer, non_defined_words, conversation, counts=None):
+    # tokens are the (token, normalized) pairs already produced for conversation; it is not tokenized again.
+    # counts from the classify_tokens call that produced non_defined_words spare a second pass over the lexicon
+    performance_score = tokenizer.evaluate_performance(conversation)
+    if counts is None:
+        counts, _ = tokenizer.classify_tokens(tokens)
+    return EvaluationResults.from_counts(counts, len(non_defined_words), performance_score)
+
+
+def score_text(tokenizer, text):
+    # Headless equivalent of what the GUI shows for an opened file
+    tokens = tokenizer.tokenize(text)
+    counts, non_defined_words = tokenizer.classify_tokens(tokens)
+    metrics.count('conversations')
+    return evaluate_text(tokens, tokenizer, non_defined_words, text, counts)
+
+
+def results_from_token_counts(tokenizer, token_counts, performance_score):
+    # Evaluation results from {(token, normalized): occurrences}; the lexicon is consulted once per distinct token
+    counts = {'positive': 0, 'negative': 0, 'neutral': 0, 'undefined': 0}
+    undefined_words = 0
+    lexicon = tokenizer.lexicon
+    with metrics.timed('lexicon'):
+        for (_, normalized_token), occurrences in token_counts.items():
+            category = lexicon.get(normalized_token)
+            if category is None:
+                counts['undefined'] += occurrences
+                undefined_words += 1
+            else:
+                counts[category] += occurrences
+    return EvaluationResults.from_counts(counts, undefined_words, performance_score)
+
+
+class StreamingScorer:
+    """
+    Scores one conversation fed in arbitrary chunks, producing the same results as score_text.
+    Only the occurrences of each distinct (token, normalized) pair and the automaton state are kept,
+    so memory depends on the vocabulary of the conversation, not on its length.
+    The pairs do not depend on the lexicon, so results can be recomputed for another lexicon.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.phrases = PhraseStream(tokenizer.performance_matcher)
+        self.token_counts = Counter()
+        self._pending = ''
+
+    def feed(self, text):
+        text = text.lower()
+        with metrics.timed('phrases'):
+            self.phrases.feed(text)
+        text = self._pending + text
+        split = _TRAILING_WORD.search(text).start()
+        self._pending = text[split:]
+        self.token_counts.update(self.tokenizer.tokenize(text[:split]))
+
+    def feed_stream(self, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Feeds a text stream from its current position to its end, chunk_size characters at a time
+        while True:
+            with metrics.timed('read'):
+                chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            metrics.count('characters_read', len(chunk))
+            self.feed(chunk)
+
+    @property
+    def performance_score(self):
+        return len(self.phrases.matches)
+
+    def close(self):
+        if self._pending:
+            self.token_counts.update(self.tokenizer.tokenize(self._pending))
+            self._pending = ''
+        metrics.count('conversations')
+        return results_from_token_counts(self.tokenizer, self.token_counts, self.performance_score)
+
+
+def score_stream(tokenizer, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Scores a single conversation from a text stream without loading it whole
+    scorer = StreamingScorer(tokenizer)
+    scorer.feed_stream(stream, chunk_size)
+    return scorer.close()
+
+
+def score_file(tokenizer, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return score_stream(tokenizer, file, chunk_size)
+
+
+def conversation_text(conversation):
+    # A conversation given as a list of lines, like the entries of examples.json, or as a single string
+    if isinstance(conversation, list):
+        return "\n".join(conversation) + "\n"
+    return conversation
+
+
+def iter_dump_conversations(stream):
+    # Splits a multi-conversation dump on blank lines, yielding each conversation's text
+    lines = []
+    for line in stream:
+        if line.strip():
+            lines.append(line)
+        elif lines:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
@@ -0,0 +1,92 @@
+from array import array
+from itertools import filterfalse, islice
+
+
+class Vocabulary:
+    """
+    Interns the tokens of one or many conversations: each distinct token gets an integer id and is
+    normalized once. TokenArrays sharing a vocabulary store only ids, so a batch of tokenized
+    conversations holds every distinct string a single time.
+    """
+
+    __slots__ = ('tokenizer', 'ids', 'tokens', 'normalized_ids', 'normalized_words', '_normalized_word_ids')
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.ids = {}
+        self.tokens = []
+        # Token id -> normalized word id, and normalized word id -> normalized word
+        self.normalized_ids = array('I')
+        self.normalized_words = []
+        self._normalized_word_ids = {}
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def intern(self, token):
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.ids[token] = token_id
+            self.tokens.append(token)
+            normalized_token = self.tokenizer.normalize_word(token)
+            normalized_id = self._normalized_word_ids.setdefault(normalized_token, len(self.normalized_words))
+            if normalized_id == len(self.normalized_words):
+                self.normalized_words.append(normalized_token)
+            self.normalized_ids.append(normalized_id)
+        return token_id
+
+    def intern_all(self, tokens):
+        # Ids of a list of tokens as an array('I'), looked up by map without a Python loop per token.
+        # Only when a lookup misses are the tokens not seen before interned, as a batch in order of first occurrence
+        ids = self.ids
+        try:
+            return array('I', map(ids.__getitem__, tokens))
+        except KeyError:
+            pass
+        new_tokens = list(filterfalse(ids.__contains__, dict.fromkeys(tokens)))
+        first_id = len(self.tokens)
+        ids.update(zip(new_tokens, range(first_id, first_id + len(new_tokens))))
+        self.tokens.extend(new_tokens)
+        # setdefault evaluates len() before inserting, so new normalized words get consecutive ids
+        word_ids = self._normalized_word_ids
+        known_words = len(word_ids)
+        self.normalized_ids.extend([word_ids.setdefault(word, len(word_ids))
+                                    for word in map(self.tokenizer.normalize_word, new_tokens)])
+        self.normalized_words.extend(islice(word_ids, known_words, None))
+        return array('I', map(ids.__getitem__, tokens))
+
+    def normalized(self, token_id):
+        return self.normalized_words[self.normalized_ids[token_id]]
+
+
+class TokenArray:
+    """
+    The tokens of one conversation as three flat arrays: vocabulary ids and the start and end
+    character offsets of each token in the original text (4 bytes each, texts up to 4 GiB).
+    Iterating yields the same (token, normalized) pairs as Tokenizer.tokenize.
+    """
+
+    __slots__ = ('vocabulary', 'token_ids', 'starts', 'ends')
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        self.token_ids = array('I')
+        self.starts = array('I')
+        self.ends = array('I')
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    def __iter__(self):
+        tokens = self.vocabulary.tokens
+        normalized = self.vocabulary.normalized
+        for token_id in self.token_ids:
+            yield tokens[token_id], normalized(token_id)
+
+    def with_offsets(self):
+        # (token, normalized, start, end), with the character offsets of each token in the original text
+        tokens = self.vocabulary.tokens
+        normalized = self.vocabulary.normalized
+        for token_id, start, end in zip(self.token_ids, self.starts, self.ends):
+            yield tokens[token_id], normalized(token_id), start, end
@@ -1,97 +1,408 @@
-import json
+from array import array
+import copy
+import functools
+import hashlib
+import logging
+import marshal
 import re
-from utils import log_message
+import sys
+from collections.abc import Mapping
+from logic import metrics
+from logic.lexicon_store import LexiconStore, write_atomically
+from logic.normalizer import get_normalizer, normalizer_fingerprint
+from logic.phrase_matcher import PhraseMatcher
+from logic.token_array import TokenArray, Vocabulary
+from utils import log_enabled, log_message
+
+CATEGORIES = ('positive', 'negative', 'neutral')
+
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+# Bump whenever the layout of the precompiled lexicon (tokens.json.compiled) changes
+COMPILED_FORMAT = 1
+
+# Conversational vocabulary is Zipfian, so a bounded cache of normalized words hits almost always
+DEFAULT_NORMALIZE_CACHE_SIZE = 65536
+
+PERFORMANCE_CRITERIA = {
+    "greeting": ["Buenas noches","¿Cómo está?","¿Cómo le va?","¡Bienvenido!","¡Bienvenida!","¿En qué puedo ayudarle?","¿Cómo puedo asistirte?","Hola, ¿cómo estás?","Hola, ¿qué tal?","¡Hola, bienvenido!","¡Hola, bienvenida!","¿Qué tal su día?","¿Qué tal su mañana?","¿Qué tal su tarde?","¡Buenos días, bienvenido!","¡Buenas tardes, bienvenida!","¡Buenos días, señor!","¡Buenas tardes, señora!","¡Buenas noches, señor!","¡Buenas noches, señora!","Hola, ¿cómo le puedo ayudar?","Hola, ¿cómo le va hoy?","Hola, ¿qué tal su día?","¡Hola, qué gusto verlo!","¡Hola, qué gusto verla!","¿Cómo amaneció?","¿Cómo anocheció?","¿En qué puedo servirle hoy?","¿Cómo puedo asistirte hoy?","¡Hola, bienvenido de nuevo!","¡Hola, bienvenida de nuevo!","¿Cómo ha estado?","¿Cómo ha sido su día?","¡Hola, qué alegría verlo!","¡Hola, qué alegría verla!","¡Qué gusto tenerlo aquí!","¡Qué gusto tenerla aquí!","Hola, ¿cómo está usted?","¡Hola, buenos días!","¡Hola, buenas tardes!","¡Hola, buenas noches!","Hola, ¿qué puedo hacer por usted?","Hola, ¿cómo ha estado?","¡Hola, qué placer verlo!","¡Hola, qué placer verla!","Hola, ¿cómo le ha ido?","Hola, ¿cómo le ha estado yendo?","¡Hola, bienvenido a nuestro servicio!","¡Hola, bienvenida a nuestro servicio!","Hola, ¿qué tal ha sido su experiencia?",],
+    "ask_number": ["número de teléfono","número de cuenta","número de pedido","número de referencia","número de identificación","número de transacción","número de tarjeta","número de factura","número de seguro social","número de tarjeta de crédito","número de reserva","número de confirmación","número de serie","número de membresía","número de póliza","número de seguimiento","número de recibo","número de inscripción","número de registro","número de contrato"],
+    "provide_info": ["detalle","balance","información","detalles","estado","disponible","transacciones","última operación","historial","datos","documentos","actualización","movimientos","cobertura","informes","extracto","registro","comprobante","notificación","alerta"],
+    "offer_assistance": ["puedo ayudarle","necesita ayuda","puedo asistirte","puedo hacer algo más","algo más que pueda hacer","requiere asistencia","alguna otra cosa","algo adicional","otra cosa","puedo ofrecerle algo más","puedo asistirlo en algo más","alguna otra ayuda","necesita otra cosa","algo más que pueda necesitar","puedo ayudar con algo más","hay algo más","algo más que necesite","necesita algo adicional","puedo ofrecer más ayuda","hay algo más que desee"],
+    "end_politely": ["hasta pronto","nos vemos","que tenga buen día","que tenga buena tarde","que tenga buena noche","que pase bien","cuídese","le agradezco","gracias por su tiempo","muchas gracias","fue un placer","hasta la próxima","le deseo lo mejor","hasta mañana","adiós","quedamos a su disposición","quedamos a sus órdenes","gracias por contactarnos","que tenga un excelente día","saludos cordiales"]
+}
+
+
+def _analysis_fingerprint(criteria, normalizer):
+    # Digest of everything that turns text into tokens and criteria matches, independent of the lexicon.
+    # The normalizer's name and version stand for its rules, so results cached with other rules are discarded
+    digest = hashlib.sha256(f"normalizer={normalizer_fingerprint(normalizer)}\n".encode('utf-8'))
+    for key, phrases in criteria.items():
+        digest.update(f"{key}\t{'|'.join(phrases)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _load_compiled(compiled_path, signature, analysis):
+    # The precompiled lexicon, or None if it is missing, unreadable or out of date
+    try:
+        # loads on the whole file: marshal.load reads a file object in many small reads
+        with open(compiled_path, 'rb') as file:
+            compiled = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (not isinstance(compiled, dict) or compiled.get('format') != COMPILED_FORMAT
+            or compiled.get('python') != sys.implementation.cache_tag
+            or compiled.get('signature') != signature or compiled.get('analysis') != analysis):
+        return None
+    return compiled
+
+
+def _save_compiled(compiled_path, tokenizer, signature):
+    compiled = {
+        'format': COMPILED_FORMAT,
+        'python': sys.implementation.cache_tag,
+        'signature': signature,
+        'analysis': tokenizer.analysis_fingerprint(),
+        'words': {category: list(getattr(tokenizer, f"_{category}_words")) for category in CATEGORIES},
+        'lexicon': tokenizer.lexicon,
+        'matcher': tokenizer.performance_matcher.tables(),
+    }
+    try:
+        write_atomically(compiled_path, marshal.dumps(compiled))
+    except (OSError, ValueError) as e:
+        # A read-only lexicon directory only costs the next start its speed
+        log_message("Could not save the precompiled lexicon %s: %s", compiled_path, e, level=logging.WARNING)
+
+
+def _lowered_offsets(text):
+    # Offset in text of the character each character of text.lower() comes from, for the few
+    # characters (such as İ) whose lowercase form is longer than one character
+    offsets = array('I')
+    for index, char in enumerate(text):
+        offsets.extend([index] * len(char.lower()))
+    return offsets
+
+
+class CategoryCounts(Mapping):
+    """
+    Token counts per category, with 'undefined' for tokens outside the lexicon.
+    A mapping keyed by category name like the dicts it replaces, whose counts can be updated in place.
+    """
+
+    __slots__ = ('positive', 'negative', 'neutral', 'undefined')
+
+    def __init__(self, positive=0, negative=0, neutral=0, undefined=0):
+        self.positive = positive
+        self.negative = negative
+        self.neutral = neutral
+        self.undefined = undefined
+
+    def __getitem__(self, category):
+        if category not in self.__slots__:
+            raise KeyError(category)
+        return getattr(self, category)
+
+    def __setitem__(self, category, value):
+        if category not in self.__slots__:
+            raise KeyError(category)
+        setattr(self, category, value)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"CategoryCounts({', '.join(f'{category}={count}' for category, count in self.items())})"
+
+
+class ExperienceResults(Mapping):
+    """
+    Experience of one conversation: a read-only mapping with the positive, negative and neutral
+    counts and the score (positive minus negative), like the dict evaluate_experience returned.
+    """
+
+    __slots__ = ('positive', 'negative', 'neutral')
+
+    _FIELDS = ('positive', 'negative', 'neutral', 'score')
+
+    def __init__(self, positive, negative, neutral):
+        self.positive = positive
+        self.negative = negative
+        self.neutral = neutral
+
+    @property
+    def score(self):
+        return self.positive - self.negative
+
+    def __getitem__(self, field):
+        if field not in self._FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self):
+        return iter(self._FIELDS)
+
+    def __len__(self):
+        return len(self._FIELDS)
+
+    def __repr__(self):
+        return f"ExperienceResults({dict(self)})"
+
+
+def _word_list_property(category):
+    # Reassigning a word list (e.g. from the "Update Tokens" dialog) rebuilds the lexicon index
+    attribute = f"_{category}_words"
+
+    def getter(self):
+        return getattr(self, attribute)
+
+    def setter(self, words):
+        setattr(self, attribute, list(words))
+        self._rebuild_lexicon()
+
+    return property(getter, setter)
+
 
 class Tokenizer:
-    def __init__(self, positive_words, negative_words, neutral_words):
+    positive_words = _word_list_property('positive')
+    negative_words = _word_list_property('negative')
+    neutral_words = _word_list_property('neutral')
+
+    def __init__(self, positive_words, negative_words, neutral_words, criteria=PERFORMANCE_CRITERIA,
+                 normalize_cache_size=DEFAULT_NORMALIZE_CACHE_SIZE, lexicon=None, performance_matcher=None, normalizer=None):
+        # lexicon and performance_matcher skip the index and automaton build when they were precompiled.
+        # normalizer: a name from logic.normalizer.NORMALIZERS or an object with name, version and normalize(word)
         log_message("Tokenizer.__init__ called")
-        self.positive_words = positive_words
-        self.negative_words = negative_words
-        self.neutral_words = neutral_words
+        self.criteria = criteria
+        self.performance_matcher = performance_matcher if performance_matcher is not None else PhraseMatcher(criteria)
+        self.normalizer = get_normalizer(normalizer)
+        # Per-instance LRU cache; maxsize=None makes it unbounded, 0 disables it
+        self._normalize_cached = functools.lru_cache(maxsize=normalize_cache_size)(self.normalizer.normalize)
+        self._positive_words = list(positive_words)
+        self._negative_words = list(negative_words)
+        self._neutral_words = list(neutral_words)
+        self._lexicon_fingerprint = None
+        # Set by from_json; used to persist words classified through the GUI
+        self.lexicon_store = None
+        if lexicon is None:
+            self._rebuild_lexicon()
+        else:
+            self.lexicon = lexicon
         # log_message(f"Tokenizer initialized with positive_words={positive_words}, negative_words={negative_words}, neutral_words={neutral_words}")
 
     @classmethod
-    def from_json(cls, json_file_path):
+    def from_json(cls, json_file_path, precompiled=True, **kwargs):
         log_message("Tokenizer.from_json called")
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            # log_message(f"Loaded data from {json_file_path}: {data}")
-        return cls(
-            positive_words=data['BUENAS'],
-            negative_words=data['MALAS'],
-            neutral_words=data['NEUTRAS']
+        store = LexiconStore(json_file_path)
+        # With precompiled, the normalized lexicon and the criteria automaton are kept in
+        # tokens.json.compiled and reused as long as tokens.json and its journal are unchanged
+        compiled_path = json_file_path + '.compiled'
+        signature = store.signature()
+        compiled = None
+        normalizer = kwargs['normalizer'] = get_normalizer(kwargs.get('normalizer'))
+        if precompiled:
+            compiled = _load_compiled(compiled_path, signature, _analysis_fingerprint(kwargs.get('criteria', PERFORMANCE_CRITERIA), normalizer))
+        if compiled is not None:
+            words = compiled['words']
+            store.track(words)
+            kwargs.update(lexicon=compiled['lexicon'], performance_matcher=PhraseMatcher.from_tables(compiled['matcher']))
+        else:
+            # Snapshot plus any journaled words not yet compacted into it
+            words = store.load()
+        tokenizer = cls(
+            positive_words=words['positive'],
+            negative_words=words['negative'],
+            neutral_words=words['neutral'],
+            **kwargs
         )
+        tokenizer.lexicon_store = store
+        if precompiled and compiled is None:
+            _save_compiled(compiled_path, tokenizer, signature)
+        return tokenizer
+
+    def snapshot(self):
+        # A copy of the lexicon as it is now, which later set_category/add_word calls do not touch, so another
+        # thread can score with it while this one keeps classifying words. Take it on the thread that
+        # modifies the lexicon. The automaton, normalizer and normalization cache are shared
+        snapshot = copy.copy(self)
+        for category in CATEGORIES:
+            setattr(snapshot, f"_{category}_words", list(getattr(self, f"_{category}_words")))
+        snapshot.lexicon = dict(self.lexicon)
+        return snapshot
+
+    def _rebuild_lexicon(self):
+        # Map every lexicon word to its category so lookups are O(1) instead of list scans.
+        # Keys are pre-normalized so a normalized token is looked up as is.
+        lexicon = {}
+        conflicts = []
+        normalize = self._normalize_cached
+        for category in CATEGORIES:
+            for word in getattr(self, f"_{category}_words"):
+                key = normalize(word)
+                first = lexicon.setdefault(key, category)
+                if first != category:
+                    conflicts.append(f"{word} ({category}; '{key}' is {first})")
+        if conflicts:
+            # Lists edited by hand or journaled without set_category; the first category wins
+            log_message("Lexicon words normalized like a word of another category: %s", ", ".join(conflicts), level=logging.WARNING)
+        self.lexicon = lexicon
+        self._lexicon_fingerprint = None
+
+    def set_category(self, word, category):
+        # Puts word in category, taking it out of any other. The words of other categories that normalize
+        # like word share its lexicon entry, so they move with it; they are returned so the caller can
+        # persist and report the move. A word already in category is not added again
+        if category not in CATEGORIES:
+            raise ValueError(f"Unknown category: {category}")
+        normalize = self._normalize_cached
+        key = normalize(word)
+        moved = []
+        removed = False
+        for other in CATEGORIES:
+            if other == category:
+                continue
+            words = getattr(self, f"_{other}_words")
+            kept = []
+            for other_word in words:
+                if other_word == word:
+                    removed = True
+                elif normalize(other_word) == key:
+                    if other_word not in moved:
+                        moved.append(other_word)
+                else:
+                    kept.append(other_word)
+            words[:] = kept
+        words = getattr(self, f"_{category}_words")
+        for added in [word] + moved:
+            if added not in words:
+                words.append(added)
+        if removed or moved:
+            self._rebuild_lexicon()
+        else:
+            # No other category held the key, so only this entry changes
+            self.lexicon[key] = category
+            self._lexicon_fingerprint = None
+        return moved
+
+    def add_word(self, word, category):
+        # Adds word to category unless it is already there; a key of another category keeps that category
+        if category not in CATEGORIES:
+            raise ValueError(f"Unknown category: {category}")
+        words = getattr(self, f"_{category}_words")
+        if word in words:
+            return
+        words.append(word)
+        self.lexicon.setdefault(self._normalize_cached(word), category)
+        self._lexicon_fingerprint = None
+
+    def lexicon_fingerprint(self):
+        # Digest of the normalized lexicon; changes whenever a word is added or changes category
+        if self._lexicon_fingerprint is None:
+            digest = hashlib.sha256()
+            for word, category in sorted(self.lexicon.items()):
+                digest.update(f"{word}\t{category}\n".encode('utf-8'))
+            self._lexicon_fingerprint = digest.hexdigest()
+        return self._lexicon_fingerprint
+
+    def analysis_fingerprint(self):
+        return _analysis_fingerprint(self.criteria, self.normalizer)
+
+    def classify(self, normalized_word):
+        # Returns 'positive', 'negative', 'neutral' or None for undefined words
+        return self.lexicon.get(normalized_word)
+
+    def classify_tokens(self, tokens):
+        # Single pass over (token, normalized) pairs counting every category at once
+        counts = {'positive': 0, 'negative': 0, 'neutral': 0, 'undefined': 0}
+        non_defined_words = {}
+        lexicon = self.lexicon
+        with metrics.timed('lexicon'):
+            for token, normalized_token in tokens:
+                category = lexicon.get(normalized_token)
+                if category is None:
+                    counts['undefined'] += 1
+                    non_defined_words[token] = normalized_token
+                else:
+                    counts[category] += 1
+        return CategoryCounts(**counts), non_defined_words
 
     def normalize_word(self, original_word):
-        # log_message(f"Tokenizer.normalize_word called with original_word={original_word}")
-        # Normalize word to handle number and gender variations
-        updated_word = original_word.lower()
-        # log_message(f"Word converted to lowercase: {updated_word}")
-        if updated_word.isdigit():
-            # log_message("Word is a digit, returning 'neutral_number'")
-            return 'neutral_number'  # Special token for numbers
-        if updated_word.endswith('s'):
-            updated_word = updated_word[:-1]  # Remove plural 's'
-            # log_message(f"Removed plural 's': {updated_word}")
-        if updated_word.endswith('a'):
-            updated_word = updated_word[:-1] + 'o'  # Convert feminine to masculine
-            # log_message(f"Converted feminine to masculine: {updated_word}")
-        return updated_word
+        return self._normalize_cached(original_word)
+
+    def normalization_cache_info(self):
+        # functools cache statistics: hits, misses, maxsize, currsize
+        return self._normalize_cached.cache_info()
+
+    def clear_normalization_cache(self):
+        self._normalize_cached.cache_clear()
 
     def tokenize(self, text):
-        log_message(f"Tokenizer.tokenize called with text={text}")
         # Improved tokenization to handle punctuation and special characters
-        tokens = re.findall(r'\b\w+\b', text.lower())
-        log_message(f"Tokenized text into tokens: {tokens}")
-        normalized_tokens = [(token, self.normalize_word(token)) for token in tokens]
-        log_message(f"Normalized tokens: {normalized_tokens}")
+        with metrics.timed('tokenize'):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+        normalize = self._normalize_cached
+        with metrics.timed('normalize'):
+            normalized_tokens = [(token, normalize(token)) for token in tokens]
+        metrics.count('tokens', len(tokens))
+        if log_enabled():
+            log_message("Tokenizer.tokenize: %d tokens, normalized: %s", len(tokens), normalized_tokens)
         return normalized_tokens
 
+    def score_corpus(self, texts):
+        # Vectorized scoring of many conversations (see logic/corpus.py); NumPy is only imported here
+        from logic.corpus import score_corpus
+        return score_corpus(self, texts)
+
+    def tokenize_compact(self, text, vocabulary=None):
+        # Same tokens as tokenize, with the offsets of each one in text, as a TokenArray; pass one
+        # Vocabulary to share it between conversations
+        tokens = TokenArray(vocabulary if vocabulary is not None else Vocabulary(self))
+        intern = tokens.vocabulary.intern
+        token_ids, starts, ends = tokens.token_ids, tokens.starts, tokens.ends
+        # Matched on the lowercased text like tokenize, since lowercasing can change where words split
+        lowered = text.lower()
+        offsets = _lowered_offsets(text) if len(lowered) != len(text) else None
+        # Tokens are normalized as they are interned, so this stage includes normalization
+        with metrics.timed('tokenize'):
+            for match in TOKEN_PATTERN.finditer(lowered):
+                start, end = match.span()
+                if offsets is not None:
+                    start, end = offsets[start], offsets[end - 1] + 1
+                token_ids.append(intern(match.group()))
+                starts.append(start)
+                ends.append(end)
+        metrics.count('tokens', len(token_ids))
+        return tokens
+
     def evaluate(self, tokens):
-        log_message(f"Tokenizer.evaluate called with tokens={tokens}")
-        positive_count = sum(1 for token in tokens if token in self.positive_words)
-        negative_count = sum(1 for token in tokens if token in self.negative_words)
-        neutral_count = sum(1 for token in tokens if token in self.neutral_words)
-        log_message(f"Evaluation results - positive: {positive_count}, negative: {negative_count}, neutral: {neutral_count}")
-        
-        return {
-            'positive': positive_count,
-            'negative': negative_count,
-            'neutral': neutral_count
-        }
+        counts = {'positive': 0, 'negative': 0, 'neutral': 0, 'undefined': 0}
+        lexicon = self.lexicon
+        for token in tokens:
+            counts[lexicon.get(token, 'undefined')] += 1
+        log_message("Evaluation results - positive: %d, negative: %d, neutral: %d", counts['positive'], counts['negative'], counts['neutral'])
+
+        return CategoryCounts(**counts)
 
     def evaluate_performance(self, conversation):
-        log_message("Tokenizer.evaluate_performance called")
-        criteria = {
-            "greeting": ["Buenas noches","¿Cómo está?","¿Cómo le va?","¡Bienvenido!","¡Bienvenida!","¿En qué puedo ayudarle?","¿Cómo puedo asistirte?","Hola, ¿cómo estás?","Hola, ¿qué tal?","¡Hola, bienvenido!","¡Hola, bienvenida!","¿Qué tal su día?","¿Qué tal su mañana?","¿Qué tal su tarde?","¡Buenos días, bienvenido!","¡Buenas tardes, bienvenida!","¡Buenos días, señor!","¡Buenas tardes, señora!","¡Buenas noches, señor!","¡Buenas noches, señora!","Hola, ¿cómo le puedo ayudar?","Hola, ¿cómo le va hoy?","Hola, ¿qué tal su día?","¡Hola, qué gusto verlo!","¡Hola, qué gusto verla!","¿Cómo amaneció?","¿Cómo anocheció?","¿En qué puedo servirle hoy?","¿Cómo puedo asistirte hoy?","¡Hola, bienvenido de nuevo!","¡Hola, bienvenida de nuevo!","¿Cómo ha estado?","¿Cómo ha sido su día?","¡Hola, qué alegría verlo!","¡Hola, qué alegría verla!","¡Qué gusto tenerlo aquí!","¡Qué gusto tenerla aquí!","Hola, ¿cómo está usted?","¡Hola, buenos días!","¡Hola, buenas tardes!","¡Hola, buenas noches!","Hola, ¿qué puedo hacer por usted?","Hola, ¿cómo ha estado?","¡Hola, qué placer verlo!","¡Hola, qué placer verla!","Hola, ¿cómo le ha ido?","Hola, ¿cómo le ha estado yendo?","¡Hola, bienvenido a nuestro servicio!","¡Hola, bienvenida a nuestro servicio!","Hola, ¿qué tal ha sido su experiencia?",],
-            "ask_number": ["número de teléfono","número de cuenta","número de pedido","número de referencia","número de identificación","número de transacción","número de tarjeta","número de factura","número de seguro social","número de tarjeta de crédito","número de reserva","número de confirmación","número de serie","número de membresía","número de póliza","número de seguimiento","número de recibo","número de inscripción","número de registro","número de contrato"],
-            "provide_info": ["detalle","balance","información","detalles","estado","disponible","transacciones","última operación","historial","datos","documentos","actualización","movimientos","cobertura","informes","extracto","registro","comprobante","notificación","alerta"],
-            "offer_assistance": ["puedo ayudarle","necesita ayuda","puedo asistirte","puedo hacer algo más","algo más que pueda hacer","requiere asistencia","alguna otra cosa","algo adicional","otra cosa","puedo ofrecerle algo más","puedo asistirlo en algo más","alguna otra ayuda","necesita otra cosa","algo más que pueda necesitar","puedo ayudar con algo más","hay algo más","algo más que necesite","necesita algo adicional","puedo ofrecer más ayuda","hay algo más que desee"],
-            "end_politely": ["hasta pronto","nos vemos","que tenga buen día","que tenga buena tarde","que tenga buena noche","que pase bien","cuídese","le agradezco","gracias por su tiempo","muchas gracias","fue un placer","hasta la próxima","le deseo lo mejor","hasta mañana","adiós","quedamos a su disposición","quedamos a sus órdenes","gracias por contactarnos","que tenga un excelente día","saludos cordiales"]
-        }
-        
-        performance_score = 0
-        for key, phrases in criteria.items():
-            if any(phrase in conversation.lower() for phrase in phrases):
-                performance_score += 1
-                log_message(f"Criteria '{key}' met")
-        
-        log_message(f"Performance score: {performance_score}/{len(criteria)}")
+        matches = self.match_performance_criteria(conversation)
+        if log_enabled():
+            for key, (phrase, start, _) in matches.items():
+                log_message("Criteria '%s' met by '%s' at %d", key, phrase, start)
+
+        performance_score = len(matches)
+        log_message("Performance score: %d/%d", performance_score, len(self.performance_matcher.keys))
         return performance_score
 
+    def match_performance_criteria(self, conversation):
+        # {criterion: (phrase, start, end)} for the first phrase of each criterion found in the conversation
+        with metrics.timed('phrases'):
+            return self.performance_matcher.first_matches(conversation.lower())
+
     def evaluate_experience(self, conversation):
-        log_message("Tokenizer.evaluate_experience called")
         tokens = self.tokenize(conversation)
-        positive_count = sum(1 for _, normalized_word in tokens if normalized_word in self.positive_words)
-        negative_count = sum(1 for _, normalized_word in tokens if normalized_word in self.negative_words)
-        neutral_count = sum(1 for _, normalized_word in tokens if normalized_word in self.neutral_words)
-        
-        experience_score = positive_count - negative_count
-        log_message(f"Experience score: {experience_score} (positive: {positive_count}, negative: {negative_count}, neutral: {neutral_count})")
-        
-        return {
-            "positive": positive_count,
-            "negative": negative_count,
-            "neutral": neutral_count,
-            "score": experience_score
-        }
+        counts, _ = self.classify_tokens(tokens)
+        results = ExperienceResults(counts.positive, counts.negative, counts.neutral)
+        log_message("Experience score: %d (positive: %d, negative: %d, neutral: %d)", results.score, results.positive, results.negative, results.neutral)
+        return results
@@ -0,0 +1,48 @@
+import logging
+import os
+
+from logic import metrics
+from logic.result_cache import ResultCache
+from logic.tokenizer import Tokenizer
+from utils import configure_logging, log_message
+
+DEFAULT_TOKENS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tokens.json')
+
+# State of a scoring process (pool worker, or the main process when it scores itself), set by init_worker
+_tokens_path = None
+_tokenizer = None
+_generation = None
+_cache = None
+
+
+def init_worker(tokens_path, log_level, collect_metrics=False, cache_path=None):
+    # Pool initializer shared by the CLI, the pipeline and the server: logging, metrics, the
+    # lexicon of generation 0 and, with cache_path, a result cache connection of this process
+    global _tokens_path, _tokenizer, _generation, _cache
+    configure_logging(log_level)
+    if collect_metrics:
+        metrics.enable()
+    _tokens_path = tokens_path
+    _tokenizer = Tokenizer.from_json(tokens_path)
+    _generation = 0
+    if cache_path is not None:
+        _cache = ResultCache(cache_path)
+
+
+def worker_tokenizer(generation=0):
+    # The tokenizer of this process, loaded again when the caller's lexicon generation is newer
+    global _tokenizer, _generation
+    if generation != _generation:
+        _tokenizer = Tokenizer.from_json(_tokens_path)
+        _generation = generation
+        log_message("Worker %d loaded lexicon generation %d", os.getpid(), generation, level=logging.INFO)
+    return _tokenizer
+
+
+def worker_cache():
+    return _cache
+
+
+def call_with_metrics(function, *args):
+    # Runs function in a worker and returns (result, metrics recorded meanwhile) for the parent to merge
+    return function(*args), metrics.drain()
@@ -1,7 +1,9 @@
 from gui.gui import LanguageTokenizerGUI
 import tkinter as tk
+from utils import configure_logging
 
 if __name__ == "__main__":
+    configure_logging()
     root = tk.Tk()
     app = LanguageTokenizerGUI(root)
     app.run()
@@ -0,0 +1,410 @@
+import argparse
+import functools
+import json
+import logging
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from logic import metrics
+from logic.scoring import conversation_text, score_text
+from logic.tokenizer import Tokenizer
+from logic.worker import DEFAULT_TOKENS_PATH, call_with_metrics, init_worker, worker_tokenizer
+from utils import configure_logging, log_message
+
+
+def _score_batch(generation, conversations):
+    # Each worker reloads the lexicon when the service bumped the generation since its last batch
+    return _score_each(worker_tokenizer(generation), conversations)
+
+
+def _score_each(tokenizer, conversations):
+    # A batch mixes the conversations of several clients, so one that fails to score only fails its own request
+    results = []
+    for text in conversations:
+        try:
+            results.append(dict(score_text(tokenizer, text)))
+        except Exception as e:
+            log_message("Failed to score a conversation: %s", e, level=logging.ERROR)
+            metrics.count('errors')
+            results.append({"error": str(e)})
+    return results
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class ScoringError(Exception):
+    pass
+
+
+class ScoringService:
+    """
+    Scores conversations for many concurrent clients with a warm lexicon.
+    Requests are queued and a batcher thread groups them into micro-batches (up to max_batch
+    conversations, waiting at most max_wait seconds for more) that are scored in a process pool;
+    with workers=0 they are scored in the batcher thread itself.
+    tokens.json and its journal are polled for changes: a new lexicon is loaded and validated, then
+    the generation is bumped so every worker reloads before its next batch. Batches already
+    dispatched finish with the lexicon they started with, so no request is dropped.
+    When a worker process dies, the requests of every batch in the pool fail at once with a
+    ScoringError and the pool is replaced by a new one.
+    With collect_metrics, stage timings of the workers are merged into this process's registry
+    (logic/metrics.py), served by GET /metrics.
+    """
+
+    def __init__(self, tokens_path=DEFAULT_TOKENS_PATH, workers=None, max_batch=64, max_wait=0.005,
+                 max_pending=10000, reload_interval=2.0, log_level=logging.WARNING, collect_metrics=False):
+        self.tokens_path = tokens_path
+        self.collect_metrics = collect_metrics
+        if collect_metrics:
+            metrics.enable()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.reload_interval = reload_interval
+        self.tokenizer = Tokenizer.from_json(tokens_path)
+        self.generation = 0
+        self._lexicon_signature = self._signature()
+        self._requests = queue.Queue(maxsize=max_pending)
+        self._stopping = threading.Event()
+        self._reload_lock = threading.Lock()
+
+        workers = os.cpu_count() if workers is None else workers
+        self.workers = workers
+        self.log_level = log_level
+        self.pool = self._start_pool() if workers > 0 else None
+        self._pool_lock = threading.Lock()
+        # At most two batches per worker in flight; meanwhile the queue fills and the next batches grow
+        self._in_flight = threading.BoundedSemaphore(max(workers, 1) * 2)
+
+        self._batcher = threading.Thread(target=self._run_batcher, name="scoring-batcher", daemon=True)
+        self._batcher.start()
+        self._watcher = None
+        if reload_interval:
+            self._watcher = threading.Thread(target=self._run_watcher, name="lexicon-watcher", daemon=True)
+            self._watcher.start()
+
+    def submit(self, text, timeout=None):
+        # Returns a Future resolved with the evaluation results of one conversation
+        future = Future()
+        try:
+            self._requests.put((text, future), timeout=timeout)
+        except queue.Full:
+            raise ServiceBusy("Too many pending conversations")
+        return future
+
+    def score(self, texts, timeout=None):
+        # Each conversation is queued on its own, so a batch request is micro-batched with concurrent ones
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = [self.submit(text, timeout) for text in texts]
+        return [future.result(None if deadline is None else max(deadline - time.monotonic(), 0)) for future in futures]
+
+    def _run_batcher(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._requests.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch):
+        texts = [text for text, _ in batch]
+        futures = [future for _, future in batch]
+        metrics.count('batches')
+        if self.pool is None:
+            with metrics.timed('batch'):
+                results = _score_each(self.tokenizer, texts)
+            _resolve(futures, results)
+            return
+
+        self._in_flight.acquire()
+        started = time.perf_counter()
+        pool = self.pool
+        score_batch = functools.partial(call_with_metrics, _score_batch) if self.collect_metrics else _score_batch
+
+        def on_done(submitted):
+            # Called however the batch ended, so the slot is always released
+            try:
+                results = submitted.result()
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                metrics.count('errors')
+                _fail(futures, ScoringError("A worker process died while scoring"))
+                return
+            except Exception as e:
+                # The whole batch failed in the worker, e.g. loading the lexicon; single conversations fail in _score_each
+                metrics.count('errors')
+                _fail(futures, e)
+                return
+            finally:
+                self._in_flight.release()
+            metrics.observe('batch', time.perf_counter() - started)
+            if self.collect_metrics:
+                results, snapshot = results
+                metrics.merge(snapshot)
+            _resolve(futures, results)
+
+        try:
+            submitted = pool.submit(score_batch, self.generation, texts)
+        except BrokenProcessPool:
+            # The pool broke after the previous batch was dispatched
+            submitted = Future()
+            submitted.set_exception(BrokenProcessPool())
+        submitted.add_done_callback(on_done)
+        log_message("Dispatched a batch of %d conversations", len(texts))
+
+    def _start_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                   initargs=(self.tokens_path, self.log_level, self.collect_metrics))
+
+    def _replace_pool(self, broken_pool):
+        # Every batch of a broken pool fails; only the first of them starts the new pool
+        with self._pool_lock:
+            if self.pool is not broken_pool:
+                return
+            log_message("A worker process died, starting a new pool", level=logging.ERROR)
+            self.pool = self._start_pool()
+        broken_pool.shutdown(wait=False)
+
+    def _signature(self):
+        # Changes whenever tokens.json is rewritten or a word is journaled
+        return self.tokenizer.lexicon_store.signature()
+
+    def _run_watcher(self):
+        while not self._stopping.wait(self.reload_interval):
+            if self._signature() != self._lexicon_signature:
+                self.reload()
+
+    def reload(self):
+        # Loads the lexicon again; on failure the current one stays in use
+        with self._reload_lock:
+            signature = self._signature()
+            try:
+                tokenizer = Tokenizer.from_json(self.tokens_path)
+            except Exception as e:
+                log_message("Keeping the current lexicon, reloading %s failed: %s", self.tokens_path, e, level=logging.ERROR)
+                return False
+            self._lexicon_signature = signature
+            self.tokenizer = tokenizer
+            self.generation += 1
+        log_message("Reloaded %s (generation %d)", self.tokens_path, self.generation, level=logging.INFO)
+        return True
+
+    def status(self):
+        return {
+            "status": "ok",
+            "generation": self.generation,
+            "lexicon": self.tokenizer.lexicon_fingerprint(),
+            "pending": self._requests.qsize(),
+        }
+
+    def close(self):
+        # Conversations already queued are still scored
+        self._stopping.set()
+        self._requests.put(None)
+        self._batcher.join()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def _resolve(futures, results):
+    for future, result in zip(futures, results):
+        if "error" in result:
+            future.set_exception(ScoringError(result["error"]))
+        else:
+            future.set_result(result)
+
+
+def _fail(futures, exception):
+    for future in futures:
+        future.set_exception(exception)
+
+
+def _is_conversation(conversation):
+    # Checked before queueing, so a malformed request is refused before it reaches a shared batch
+    if isinstance(conversation, list):
+        return all(isinstance(line, str) for line in conversation)
+    return isinstance(conversation, str)
+
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /score   {"id": ..., "conversation": "..." or [lines]}       -> {"id": ..., <evaluate_text fields>}
+                  {"conversations": [{"id": ..., "conversation": ...}]} -> {"results": [...]}
+    POST /reload  reloads tokens.json now
+    GET  /health  lexicon generation and fingerprint, pending conversations
+    GET  /metrics stage timing histograms and counters in Prometheus text format (with --metrics)
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.server.service.status())
+        elif self.path == "/metrics":
+            registry = metrics.active()
+            if registry is None:
+                self._send_json(404, {"error": "Metrics are disabled, start the server with --metrics"})
+            else:
+                self._send(200, registry.to_prometheus().encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if self.path == "/score":
+            self._score(body)
+        elif self.path == "/reload":
+            reloaded = self.server.service.reload()
+            self._send_json(200 if reloaded else 500, self.server.service.status())
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def _score(self, body):
+        batch = isinstance(body, dict) and "conversations" in body
+        items = body["conversations"] if batch else [body]
+        if not isinstance(items, list) or not all(isinstance(item, dict) and "conversation" in item for item in items):
+            self._send_json(400, {"error": "Expected {\"conversation\": ...} or {\"conversations\": [...]}"})
+            return
+        if not all(_is_conversation(item["conversation"]) for item in items):
+            self._send_json(400, {"error": "A conversation must be a string or a list of strings"})
+            return
+
+        service = self.server.service
+        try:
+            scores = service.score([conversation_text(item["conversation"]) for item in items], self.server.request_timeout)
+        except ServiceBusy as e:
+            self._send_json(503, {"error": str(e)})
+            return
+        except FutureTimeoutError:
+            self._send_json(504, {"error": "Scoring timed out"})
+            return
+        except Exception as e:
+            log_message("Failed to score request: %s", e, level=logging.ERROR)
+            self._send_json(500, {"error": str(e)})
+            return
+
+        results = []
+        for item, scores_of_item in zip(items, scores):
+            result = {"id": item["id"]} if "id" in item else {}
+            result.update(scores_of_item)
+            results.append(result)
+        self._send_json(200, {"results": results} if batch else results[0])
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length).decode('utf-8') or 'null')
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Access log at debug level through the project logger instead of stderr
+        log_message("%s - %s", self.client_address, format % args)
+
+
+class ScoringHTTPServer(ThreadingHTTPServer):
+    # socketserver's default listen backlog of 5 resets connections under bursts of clients
+    request_queue_size = 128
+
+    def __init__(self, address, service, request_timeout=None):
+        super().__init__(address, ScoringRequestHandler)
+        self.service = service
+        self.request_timeout = request_timeout
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class ScoringUnixServer(socketserver.ThreadingUnixStreamServer):
+        # Same protocol as ScoringHTTPServer, over a Unix domain socket
+        daemon_threads = True
+        request_queue_size = 128
+
+        def __init__(self, socket_path, service, request_timeout=None):
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            super().__init__(socket_path, ScoringRequestHandler)
+            self.service = service
+            self.request_timeout = request_timeout
+
+        def server_close(self):
+            super().server_close()
+            if os.path.exists(self.server_address):
+                os.unlink(self.server_address)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve conversation scores over HTTP with a warm lexicon.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("-p", "--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--socket", help="Listen on this Unix domain socket instead of TCP")
+    parser.add_argument("-t", "--tokens", default=DEFAULT_TOKENS_PATH, help="Path to tokens.json")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count, 0 scores in-process)")
+    parser.add_argument("--max-batch", type=int, default=64, help="Most conversations scored in one batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits for more conversations")
+    parser.add_argument("--max-pending", type=int, default=10000, help="Queued conversations before requests are refused with 503")
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="Seconds between checks of tokens.json for changes (0 disables)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds a request waits for its scores before a 504")
+    parser.add_argument("--metrics", action="store_true", help="Collect stage timings and counters, served by GET /metrics")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase log verbosity (-v info, -vv debug)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    log_level = [logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)]
+    configure_logging(log_level)
+
+    if args.socket and not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+        print("Unix domain sockets are not supported on this platform", file=sys.stderr)
+        return 2
+
+    service = ScoringService(args.tokens, args.workers, args.max_batch, args.max_wait_ms / 1000, args.max_pending,
+                             args.reload_interval, log_level, args.metrics)
+    if args.socket:
+        server = ScoringUnixServer(args.socket, service, args.timeout)
+    else:
+        server = ScoringHTTPServer((args.host, args.port), service, args.timeout)
+    print(f"Serving scores on {args.socket or f'http://{args.host}:{args.port}'}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import io
+import json
+
+import pytest
+
+import cli
+from logic.scoring import score_text
+from logic.tokenizer import Tokenizer
+
+
+@pytest.fixture
+def tokens_path(tmp_path):
+    path = tmp_path / 'tokens.json'
+    path.write_text(json.dumps({'BUENAS': ['gracias'], 'MALAS': ['terrible'], 'NEUTRAS': ['hola']}), encoding='utf-8')
+    return str(path)
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_cache_with_concurrent_readers(tmp_path, tokens_path):
+    folder = tmp_path / 'ejemplos'
+    folder.mkdir()
+    (folder / 'ATC_000.txt').write_text("Hola, gracias.\n", encoding='utf-8')
+    (folder / 'ATC_001.txt').write_text("Es terrible, gracias.\n", encoding='utf-8')
+    cache_path = str(tmp_path / 'cache.sqlite3')
+    output = str(tmp_path / 'out.jsonl')
+    tokenizer = Tokenizer.from_json(tokens_path)
+
+    for _ in range(2):
+        assert cli.main([str(folder), '-t', tokens_path, '-w', '0', '--readers', '2', '--cache', cache_path, '-o', output]) == 0
+
+        results = sorted(read_jsonl(output), key=lambda result: result["id"])
+        assert [result["id"] for result in results] == ['ATC_000', 'ATC_001']
+        for result in results:
+            with open(result["file"], encoding='utf-8') as file:
+                assert {field: result[field] for field in result if field not in ("id", "file")} == dict(score_text(tokenizer, file.read()))
+
+
+@pytest.mark.parametrize('options', [['-w', '1'], ['-w', '0', '--readers', '1'], ['--profile', 'profile.out']])
+def test_malformed_stdin_line_fails_alone(tmp_path, tokens_path, monkeypatch, options):
+    lines = [
+        json.dumps({"id": "c1", "conversation": ["Hola, gracias."]}),
+        '{"id": "c2", "conversation": [',
+        json.dumps({"id": "c3", "conversation": "Es terrible."}),
+        json.dumps(["no", "conversation"]),
+    ]
+    monkeypatch.setattr('sys.stdin', io.StringIO("\n".join(lines) + "\n"))
+    monkeypatch.chdir(tmp_path)
+    output = str(tmp_path / 'out.jsonl')
+
+    assert cli.main(['-', '-t', tokens_path, '-o', output] + options) == 1
+
+    results = {result["id"]: result for result in read_jsonl(output)}
+    assert sorted(results) == ['c1', 'c3', 'stdin_2', 'stdin_4']
+    assert results["c1"]["Positive Words"] == 1
+    assert results["c3"]["Negative Words"] == 1
+    assert results["stdin_2"]["error"].startswith("line 2: ")
+    assert results["stdin_4"]["error"].startswith("line 4: ")
+    assert all("error" not in results[task_id] for task_id in ('c1', 'c3'))
+
+
+def test_run_counts_malformed_lines_as_failed(tokens_path, monkeypatch):
+    monkeypatch.setattr('sys.stdin', io.StringIO('not json\n' + json.dumps({"conversation": "Hola."}) + '\n'))
+    output = io.StringIO()
+
+    assert cli.run(['-'], output, tokens_path=tokens_path, workers=1) == (2, 1)
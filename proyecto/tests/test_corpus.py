@@ -0,0 +1,45 @@
+import glob
+import os
+
+from logic.scoring import score_text
+from logic.token_array import Vocabulary
+from logic.tokenizer import TOKEN_PATTERN, Tokenizer
+
+PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_tokenizer():
+    return Tokenizer(['gracias', 'excelente'], ['terrible', 'problema'], ['hola'])
+
+
+def example_texts():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(PROYECTO, 'ejemplos', '*.txt'))):
+        with open(path, encoding='utf-8') as file:
+            texts.append(file.read())
+    return texts + ['', 'Hola, GRACIAS. Gracias por todo, 123 veces', 'Es terrible, terrible: problemas y más problemas']
+
+
+def test_corpus_results_match_score_text():
+    tokenizer = make_tokenizer()
+    texts = example_texts()
+
+    corpus = tokenizer.score_corpus(texts)
+
+    assert len(corpus) == len(texts)
+    for index, text in enumerate(texts):
+        assert dict(corpus.results(index)) == dict(score_text(tokenizer, text)), index
+
+
+def test_intern_all_matches_intern():
+    tokenizer = make_tokenizer()
+    documents = [TOKEN_PATTERN.findall(text.lower()) for text in example_texts()]
+    batch = Vocabulary(tokenizer)
+    one_by_one = Vocabulary(tokenizer)
+
+    for tokens in documents:
+        assert list(batch.intern_all(tokens)) == [one_by_one.intern(token) for token in tokens]
+
+    assert batch.tokens == one_by_one.tokens
+    assert batch.normalized_ids == one_by_one.normalized_ids
+    assert batch.normalized_words == one_by_one.normalized_words
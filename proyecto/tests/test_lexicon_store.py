@@ -0,0 +1,149 @@
+import json
+import os
+import stat
+
+import pytest
+
+from logic import lexicon_store
+from logic.lexicon_store import LexiconStore
+from logic.tokenizer import Tokenizer
+
+
+@pytest.fixture
+def tokens_path(tmp_path):
+    path = tmp_path / 'tokens.json'
+    path.write_text(json.dumps({'BUENAS': ['bueno'], 'MALAS': ['malo'], 'NEUTRAS': ['hola'], 'OTRAS': [1]}), encoding='utf-8')
+    return str(path)
+
+
+def read_snapshot(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def test_load_replays_the_journal(tokens_path):
+    LexiconStore(tokens_path).set_category('genial', 'positive')
+    LexiconStore(tokens_path).set_category('malo', 'neutral')
+
+    words = LexiconStore(tokens_path).load()
+
+    assert words == {'positive': ['bueno', 'genial'], 'negative': [], 'neutral': ['hola', 'malo']}
+    # Classifying only appends to the journal
+    assert read_snapshot(tokens_path)['BUENAS'] == ['bueno']
+
+
+def test_unknown_category_is_rejected(tokens_path):
+    with pytest.raises(ValueError):
+        LexiconStore(tokens_path).set_category('genial', 'excellent')
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(tokens_path):
+    store = LexiconStore(tokens_path, compact_bytes=1)
+    store.set_category('genial', 'positive')
+
+    assert os.path.getsize(store.journal_path) == 0
+    snapshot = read_snapshot(tokens_path)
+    assert snapshot['BUENAS'] == ['bueno', 'genial']
+    # Keys the store does not manage are kept
+    assert snapshot['OTRAS'] == [1]
+    assert store.load()['positive'] == ['bueno', 'genial']
+
+
+def test_torn_journal_line_is_skipped_and_not_continued(tokens_path):
+    store = LexiconStore(tokens_path)
+    store.set_category('genial', 'positive')
+    # A crash in the middle of an append
+    with open(store.journal_path, 'ab') as journal:
+        journal.write(b'{"word": "pes')
+    store.set_category('fatal', 'negative')
+
+    assert store.load() == {'positive': ['bueno', 'genial'], 'negative': ['malo', 'fatal'], 'neutral': ['hola']}
+
+
+def test_crash_between_compaction_steps_replays_harmlessly(tokens_path, monkeypatch):
+    store = LexiconStore(tokens_path)
+    store.set_category('genial', 'positive')
+    monkeypatch.setattr(LexiconStore, '_truncate_journal', lambda self: None)
+    store.compact()
+
+    # The snapshot already holds the entries the journal still replays
+    assert read_snapshot(tokens_path)['BUENAS'] == ['bueno', 'genial']
+    assert LexiconStore(tokens_path).load()['positive'] == ['bueno', 'genial']
+
+
+def test_compaction_keeps_the_snapshot_permissions(tokens_path):
+    # Other users of a shared lexicon must still be able to read it after the atomic rename
+    os.chmod(tokens_path, 0o644)
+    store = LexiconStore(tokens_path)
+    store.set_category('genial', 'positive')
+
+    store.compact()
+
+    assert stat.S_IMODE(os.stat(tokens_path).st_mode) == 0o644
+    assert read_snapshot(tokens_path)['BUENAS'] == ['bueno', 'genial']
+
+
+def test_failed_replace_keeps_the_journal(tokens_path, monkeypatch):
+    store = LexiconStore(tokens_path)
+    store.load()
+    store.set_category('genial', 'positive')
+
+    def fail(*args):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(lexicon_store, 'write_atomically', fail)
+    with pytest.raises(OSError):
+        store.replace({'positive': ['bueno'], 'negative': [], 'neutral': []})
+
+    assert LexiconStore(tokens_path).load()['positive'] == ['bueno', 'genial']
+
+
+def test_replace_writes_the_lists_and_empties_the_journal(tokens_path):
+    store = LexiconStore(tokens_path)
+    words = store.load()
+    store.set_category('genial', 'positive')
+    words['positive'] = ['bueno', 'genial', 'excelente']
+    words['negative'] = []
+
+    merged = store.replace(words)
+
+    assert merged == {'positive': ['bueno', 'genial', 'excelente'], 'negative': [], 'neutral': ['hola']}
+    assert os.path.getsize(store.journal_path) == 0
+    assert LexiconStore(tokens_path).load() == merged
+
+
+def test_replace_keeps_words_classified_by_other_processes(tokens_path):
+    store = LexiconStore(tokens_path)
+    words = store.load()
+    other = LexiconStore(tokens_path)
+    other.set_category('genial', 'positive')
+    other.set_category('hola', 'positive')
+    # Compaction by the other process must not hide its entries either
+    other.compact()
+
+    # The dialog edited the lists loaded before the other process wrote
+    words['negative'].append('fatal')
+    words['neutral'] = []
+    merged = store.replace(words)
+
+    assert merged == {'positive': ['bueno', 'genial', 'hola'], 'negative': ['malo', 'fatal'], 'neutral': []}
+    assert LexiconStore(tokens_path).load() == merged
+
+
+def test_load_without_a_writable_lock_file(tokens_path, tmp_path):
+    store = LexiconStore(tokens_path)
+    store.set_category('genial', 'positive')
+    # As in a read-only directory: the lock file cannot be created
+    store.lock_path = str(tmp_path / 'missing' / 'tokens.json.lock')
+
+    assert store.load()['positive'] == ['bueno', 'genial']
+    with pytest.raises(OSError):
+        store.set_category('fatal', 'negative')
+
+
+def test_tokenizer_from_json_uses_the_journal(tokens_path):
+    LexiconStore(tokens_path).set_category('genial', 'positive')
+
+    tokenizer = Tokenizer.from_json(tokens_path)
+
+    assert tokenizer.classify(tokenizer.normalize_word('genial')) == 'positive'
+    assert Tokenizer.from_json(tokens_path).positive_words == ['bueno', 'genial']
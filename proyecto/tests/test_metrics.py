@@ -0,0 +1,119 @@
+import json
+import pstats
+
+import pytest
+
+import cli
+from logic import metrics
+from logic.metrics import BUCKETS, Metrics
+
+
+@pytest.fixture(autouse=True)
+def disabled_afterwards():
+    yield
+    metrics.disable()
+
+
+@pytest.fixture
+def tokens_path(tmp_path):
+    path = tmp_path / 'tokens.json'
+    path.write_text(json.dumps({'BUENAS': ['gracias'], 'MALAS': ['terrible'], 'NEUTRAS': ['hola']}), encoding='utf-8')
+    return str(path)
+
+
+def test_hooks_do_nothing_while_disabled():
+    assert metrics.active() is None
+    with metrics.timed('tokenize'):
+        metrics.count('tokens', 3)
+    metrics.observe('batch', 0.1)
+
+    assert metrics.active() is None
+    assert metrics.drain() is None
+
+
+def test_histograms_and_counters():
+    registry = metrics.enable()
+    with metrics.timed('tokenize'):
+        pass
+    metrics.observe('tokenize', 0.002)
+    metrics.observe('tokenize', 100.0)
+    metrics.count('tokens', 3)
+    metrics.count('tokens')
+
+    data = registry.to_dict()
+
+    tokenize = data["stages"]["tokenize"]
+    assert tokenize["count"] == 3
+    assert tokenize["max"] == 100.0
+    assert tokenize["sum"] == pytest.approx(100.002, abs=0.001)
+    assert list(tokenize["buckets"]) == [repr(bound) for bound in BUCKETS] + ['+Inf']
+    assert tokenize["buckets"]['0.001'] == 1
+    assert tokenize["buckets"]['0.005'] == 2
+    assert tokenize["buckets"]['5.0'] == 2
+    assert tokenize["buckets"]['+Inf'] == 3
+    assert data["counters"] == {"tokens": 4}
+
+
+def test_worker_snapshots_are_merged():
+    parent = Metrics()
+    parent.observe('score', 0.01)
+    worker = metrics.enable()
+    metrics.observe('score', 0.02)
+    metrics.count('conversations')
+
+    parent.merge(metrics.drain())
+    parent.merge(metrics.drain())
+
+    assert worker.snapshot() == {"stages": {}, "counters": {}}
+    assert parent.to_dict()["stages"]["score"]["count"] == 2
+    assert parent.to_dict()["stages"]["score"]["max"] == 0.02
+    assert parent.counters == {"conversations": 1}
+
+
+def test_prometheus_text():
+    registry = Metrics()
+    registry.observe('read', 0.003)
+    registry.count('errors', 2)
+
+    lines = registry.to_prometheus().splitlines()
+
+    assert lines[:2] == ["# HELP proyecto_stage_seconds Time spent in each scoring stage.",
+                         "# TYPE proyecto_stage_seconds histogram"]
+    assert 'proyecto_stage_seconds_bucket{stage="read",le="0.001"} 0' in lines
+    assert 'proyecto_stage_seconds_bucket{stage="read",le="0.005"} 1' in lines
+    assert 'proyecto_stage_seconds_bucket{stage="read",le="+Inf"} 1' in lines
+    assert 'proyecto_stage_seconds_sum{stage="read"} 0.003' in lines
+    assert 'proyecto_stage_seconds_count{stage="read"} 1' in lines
+    assert lines[-2:] == ["# TYPE proyecto_errors_total counter", "proyecto_errors_total 2"]
+
+
+@pytest.mark.parametrize('workers', ['0', '1'])
+def test_cli_writes_the_metrics_of_every_stage(tmp_path, tokens_path, workers):
+    folder = tmp_path / 'ejemplos'
+    folder.mkdir()
+    for index, text in enumerate(["Hola, muchas gracias.", "Es terrible.", "Hola."]):
+        (folder / f'ATC_00{index}.txt').write_text(text, encoding='utf-8')
+    json_path = str(tmp_path / 'metrics.json')
+    prometheus_path = str(tmp_path / 'metrics.prom')
+
+    assert cli.main([str(folder), '-t', tokens_path, '-w', workers, '-o', str(tmp_path / 'out.jsonl'), '--metrics', json_path]) == 0
+    assert cli.main([str(folder), '-t', tokens_path, '-w', workers, '-o', str(tmp_path / 'out.jsonl'), '--metrics', prometheus_path]) == 0
+
+    with open(json_path, encoding='utf-8') as file:
+        data = json.load(file)
+    assert {'tokenize', 'normalize', 'lexicon', 'phrases', 'score', 'output'} <= set(data["stages"])
+    assert data["stages"]["score"]["count"] == 3
+    assert data["counters"]["conversations"] == 3
+    assert data["counters"]["tokens"] == 6
+    with open(prometheus_path, encoding='utf-8') as file:
+        assert 'proyecto_conversations_total 3' in file.read().splitlines()
+    assert metrics.active() is None
+
+
+def test_profiled_writes_a_pstats_file(tmp_path):
+    path = str(tmp_path / 'profile.out')
+
+    with metrics.profiled(path):
+        sorted(range(1000), key=str)
+
+    assert pstats.Stats(path).total_calls > 0
@@ -0,0 +1,124 @@
+import glob
+import json
+import os
+import random
+import re
+
+import pytest
+
+from logic.normalizer import (ACCENTED_STAGES, ACCENTS, LegacyNormalizer, NORMALIZER_ENV, NUMBER_TOKEN,
+                              SPANISH_SUFFIX_STAGES, SpanishNormalizer, get_normalizer)
+
+PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Words that must normalize to the same key: plurals, diminutives, verb endings and accents
+SAME_KEY = [
+    ['gracias', 'Gracias', 'gracia'],
+    ['mes', 'meses', 'MESES'],
+    ['vez', 'veces'],
+    ['papel', 'papeles'],
+    ['problema', 'problemas'],
+    ['canción', 'canciones'],
+    ['momento', 'momentito'],
+    ['poco', 'poquito'],
+    ['café', 'cafecito'],
+    ['niño', 'niños'],
+    ['esperar', 'esperando', 'esperó', 'espera', 'esperaba'],
+    ['verificar', 'verificarlo'],
+    ['nuevo', 'nuevamente'],
+]
+
+
+def lexicon_words():
+    # The words of the examples and of tokens.json, the vocabulary the table is tuned for
+    words = set()
+    for path in sorted(glob.glob(os.path.join(PROYECTO, 'ejemplos', '*.txt'))):
+        with open(path, encoding='utf-8') as file:
+            words.update(word.lower() for word in re.findall(r'\w+', file.read()))
+    with open(os.path.join(PROYECTO, 'logic', 'tokens.json'), encoding='utf-8') as file:
+        for entries in json.load(file).values():
+            words.update(entry.lower() for entry in entries)
+    return sorted(words)
+
+
+def random_words():
+    # Rule characters, accents, characters no rule reads and digits
+    rng = random.Random(3)
+    alphabet = 'aeiosrndlctmbzqugáéíóúüñkw1'
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(5000)]
+
+
+def naive_normalize(word):
+    # The stages with a scan of every rule, the reference for the suffix tries
+    word = word.lower()
+    if word.isdigit() or word == NUMBER_TOKEN:
+        return NUMBER_TOKEN
+    for index, rules in enumerate(SPANISH_SUFFIX_STAGES):
+        if index == ACCENTED_STAGES:
+            word = word.translate(ACCENTS)
+        matches = [(len(suffix), replacement) for suffix, replacement, min_stem in rules
+                   if word.endswith(suffix) and len(word) - len(suffix) >= min_stem]
+        if matches:
+            length, replacement = max(matches)
+            word = word[:-length] + replacement
+    return word
+
+
+@pytest.mark.parametrize('words', SAME_KEY)
+def test_inflections_share_a_key(words):
+    normalizer = SpanishNormalizer()
+
+    assert len({normalizer.normalize(word) for word in words}) == 1
+
+
+@pytest.mark.parametrize('word, expected', [
+    ('gracias', 'graci'),
+    ('mes', 'mes'),
+    ('meses', 'mes'),
+    ('veces', 'vez'),
+    ('papeles', 'papel'),
+    ('momentito', 'moment'),
+    ('poquito', 'poc'),
+    ('esperando', 'esper'),
+    ('verificarlo', 'verific'),
+    ('nuevamente', 'nuev'),
+    ('RÁPIDAMENTE', 'rapid'),
+    ('pingüino', 'pinguin'),
+    ('niños', 'niñ'),
+    ('es', 'es'),
+    ('x', 'x'),
+    ('', ''),
+])
+def test_spanish_rules(word, expected):
+    assert SpanishNormalizer().normalize(word) == expected
+
+
+@pytest.mark.parametrize('word', ['123', '2024', NUMBER_TOKEN])
+def test_numbers_become_the_number_token(word):
+    assert SpanishNormalizer().normalize(word) == NUMBER_TOKEN
+    assert LegacyNormalizer().normalize(word) == NUMBER_TOKEN
+
+
+def test_tries_find_the_longest_rule_of_each_stage():
+    normalizer = SpanishNormalizer()
+
+    for word in lexicon_words() + random_words():
+        assert normalizer.normalize(word) == naive_normalize(word), word
+        assert normalizer.normalize(word.upper()) == naive_normalize(word), word
+
+
+def test_legacy_normalizer_keeps_the_old_slices():
+    normalizer = LegacyNormalizer()
+
+    assert [normalizer.normalize(word) for word in ['gracias', 'mes', 'Rápido', 'poquito']] == [
+        'gracio', 'me', 'rápido', 'poquito']
+
+
+def test_get_normalizer(monkeypatch):
+    monkeypatch.setenv(NORMALIZER_ENV, 'legacy')
+    assert isinstance(get_normalizer(), LegacyNormalizer)
+    assert isinstance(get_normalizer('spanish'), SpanishNormalizer)
+    normalizer = SpanishNormalizer()
+    assert get_normalizer(normalizer) is normalizer
+    with pytest.raises(ValueError):
+        get_normalizer('english')
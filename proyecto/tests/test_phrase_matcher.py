@@ -0,0 +1,117 @@
+import glob
+import marshal
+import os
+import random
+
+import pytest
+
+from logic.phrase_matcher import PhraseMatcher, PhraseStream
+from logic.scoring import StreamingScorer, score_text
+from logic.tokenizer import PERFORMANCE_CRITERIA, Tokenizer
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ejemplos')
+
+# Phrases that overlap, nest and share prefixes and suffixes, across keys and within one
+OVERLAPPING = {
+    'he': ['he', 'hers'],
+    'she': ['she'],
+    'his': ['his', 'is'],
+    'greeting': ['buen día', 'buenos días', 'día'],
+    'repeat': ['aa', 'aaa'],
+}
+
+
+def naive_matches(phrases_by_key, text):
+    # Every (key, phrase, start, end) found with str.find, the reference for the automaton
+    matches = set()
+    for key, phrases in phrases_by_key.items():
+        for phrase in phrases:
+            phrase = phrase.lower()
+            start = text.find(phrase)
+            while start != -1:
+                matches.add((key, phrase, start, start + len(phrase)))
+                start = text.find(phrase, start + 1)
+    return matches
+
+
+def naive_first_matches(phrases_by_key, text):
+    # The occurrence of each key that ends first; the longer phrase when two end together
+    first = {}
+    for key, phrase, start, end in naive_matches(phrases_by_key, text):
+        if key not in first or (end, start) < (first[key][2], first[key][1]):
+            first[key] = (phrase, start, end)
+    return first
+
+
+def random_text(rng, alphabet, length):
+    return ''.join(rng.choice(alphabet) for _ in range(length))
+
+
+def corpus():
+    texts = ['ushers', 'hishers aaaa', 'buenos días, buen día', 'h', '', 'aaaaaaa']
+    rng = random.Random(2)
+    texts += [random_text(rng, 'aehirs ', rng.randint(0, 60)) for _ in range(200)]
+    return texts
+
+
+@pytest.mark.parametrize('text', corpus())
+def test_iter_matches_finds_every_occurrence(text):
+    matcher = PhraseMatcher(OVERLAPPING)
+
+    matches = list(matcher.iter_matches(text))
+
+    assert set(matches) == naive_matches(OVERLAPPING, text)
+    assert len(matches) == len(set(matches))
+    assert [end for _, _, _, end in matches] == sorted(end for _, _, _, end in matches)
+
+
+@pytest.mark.parametrize('text', corpus())
+def test_first_matches_is_the_earliest_of_each_key(text):
+    assert PhraseMatcher(OVERLAPPING).first_matches(text) == naive_first_matches(OVERLAPPING, text)
+
+
+def test_phrases_are_lowercased_and_empty_phrases_ignored():
+    matcher = PhraseMatcher({'greeting': ['Buenos Días', ''], 'thanks': ['GRACIAS']})
+
+    assert matcher.first_matches('hola, buenos días y gracias') == {
+        'greeting': ('buenos días', 6, 17), 'thanks': ('gracias', 20, 27)}
+    assert matcher.first_matches('') == {}
+
+
+def test_tables_survive_marshal():
+    matcher = PhraseMatcher(OVERLAPPING)
+    restored = PhraseMatcher.from_tables(marshal.loads(marshal.dumps(matcher.tables())))
+
+    for text in corpus():
+        assert list(restored.iter_matches(text)) == list(matcher.iter_matches(text))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 64, 1 << 20])
+def test_stream_matches_across_chunk_boundaries(chunk_size):
+    matcher = PhraseMatcher(OVERLAPPING)
+    for text in corpus():
+        stream = PhraseStream(matcher)
+        for start in range(0, len(text), chunk_size):
+            stream.feed(text[start:start + chunk_size])
+
+        assert stream.matches == naive_first_matches(OVERLAPPING, text)
+        assert stream.offset == len(text)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 10, 4096])
+def test_performance_score_matches_a_naive_scan_of_the_examples(chunk_size):
+    tokenizer = Tokenizer([], [], [])
+    paths = sorted(glob.glob(os.path.join(EXAMPLES, '*.txt')))
+    assert paths
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            text = file.read()
+        # Phrases are compared lowercased, like the matcher compiles them
+        expected = sum(any(phrase.lower() in text.lower() for phrase in phrases) for phrases in PERFORMANCE_CRITERIA.values())
+
+        assert tokenizer.evaluate_performance(text) == expected
+        assert score_text(tokenizer, text)['Performance Score'] == expected
+        scorer = StreamingScorer(tokenizer)
+        for start in range(0, len(text), chunk_size):
+            scorer.feed(text[start:start + chunk_size])
+        assert scorer.close()['Performance Score'] == expected
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pytest
+
+from logic import pipeline
+from logic.pipeline import run_pipeline
+from logic.result_cache import ResultCache
+from logic.scoring import score_text
+from logic.tokenizer import Tokenizer
+
+TEXTS = {
+    'ATC_000.txt': "Buenos días, gracias por llamar. ¿En qué le puedo ayudar?\nEl problema sigue, es terrible.\n",
+    'ATC_001.txt': "Hola, muchas gracias, excelente atención.\r\nQue tenga un buen día.\r\n",
+    'EXP_000.txt': "Estoy esperando hace un mes, pésimo servicio.\n" * 40,
+}
+
+
+@pytest.fixture
+def tokens_path(tmp_path):
+    path = tmp_path / 'tokens.json'
+    path.write_text(json.dumps({'BUENAS': ['gracias', 'excelente'], 'MALAS': ['terrible', 'pésimo'], 'NEUTRAS': ['hola']}),
+                    encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / 'ejemplos'
+    folder.mkdir()
+    for name, text in TEXTS.items():
+        (folder / name).write_bytes(text.encode('utf-8'))
+    return folder
+
+
+def tasks_of(folder):
+    return [(pipeline.conversation_id(str(path)), str(path), None) for path in sorted(folder.iterdir())]
+
+
+def run(tasks, tokenizer, **kwargs):
+    results = []
+    scored, failed = asyncio.run(run_pipeline(tasks, results.append, tokenizer, workers=0, **kwargs))
+    assert scored == len(tasks)
+    return {result["id"]: result for result in results}, failed
+
+
+def expected_results(folder, tokenizer):
+    results = {}
+    for path in sorted(folder.iterdir()):
+        with open(path, encoding='utf-8') as file:
+            results[pipeline.conversation_id(str(path))] = dict(score_text(tokenizer, file.read()))
+    return results
+
+
+def without_ids(results):
+    return {task_id: {field: value for field, value in result.items() if field not in ("id", "file")}
+            for task_id, result in results.items()}
+
+
+def test_large_files_are_scored_from_the_preread_prefix(folder, tokens_path, monkeypatch):
+    # Words, phrases and \r\n line ends cross the end of the prefix
+    monkeypatch.setattr(pipeline, 'PREREAD_CHARS', 7)
+    tokenizer = Tokenizer.from_json(tokens_path)
+
+    results, failed = run(tasks_of(folder), tokenizer)
+
+    assert failed == 0
+    assert without_ids(results) == expected_results(folder, tokenizer)
+
+
+def test_cache_is_consulted_before_reading(folder, tokens_path, tmp_path, monkeypatch):
+    tokenizer = Tokenizer.from_json(tokens_path)
+    cache_path = str(tmp_path / 'cache.sqlite3')
+
+    first, _ = run(tasks_of(folder), tokenizer, cache_path=cache_path)
+
+    def read_prefix(file_path):
+        raise AssertionError(f"{file_path} was read again")
+
+    monkeypatch.setattr(pipeline, '_read_prefix', read_prefix)
+    second, failed = run(tasks_of(folder), tokenizer, cache_path=cache_path)
+
+    assert failed == 0
+    assert without_ids(first) == without_ids(second) == expected_results(folder, tokenizer)
+
+
+def test_cached_results_follow_the_lexicon(folder, tokens_path, tmp_path):
+    tokenizer = Tokenizer.from_json(tokens_path)
+    cache_path = str(tmp_path / 'cache.sqlite3')
+    run(tasks_of(folder), tokenizer, cache_path=cache_path)
+
+    tokenizer.set_category('problema', 'negative')
+    results, _ = run(tasks_of(folder), tokenizer, cache_path=cache_path)
+
+    assert without_ids(results) == expected_results(folder, tokenizer)
+    with ResultCache(cache_path) as cache:
+        assert cache.lookup(tokenizer, str(folder / 'ATC_000.txt'))[1]["Negative Words"] == 2
+
+
+def test_cache_with_worker_processes(folder, tokens_path, tmp_path):
+    cache_path = str(tmp_path / 'cache.sqlite3')
+    results = []
+
+    asyncio.run(run_pipeline(tasks_of(folder), results.append, tokens_path=tokens_path, workers=1, cache_path=cache_path))
+
+    tokenizer = Tokenizer.from_json(tokens_path)
+    with ResultCache(cache_path) as cache:
+        for path in folder.iterdir():
+            _, cached = cache.lookup(tokenizer, str(path))
+            assert dict(cached) == dict(score_text(tokenizer, path.read_text(encoding='utf-8')))
+        assert cache.stats == {'hits': len(TEXTS)}
@@ -0,0 +1,80 @@
+import pytest
+
+from logic import result_cache
+from logic.result_cache import ResultCache
+from logic.scoring import score_text
+from logic.tokenizer import Tokenizer
+
+TEXT = "Hola, gracias por llamar. El problema sigue, es terrible.\n"
+
+
+def make_tokenizer(**kwargs):
+    return Tokenizer(['gracias'], ['terrible'], ['hola'], **kwargs)
+
+
+@pytest.fixture
+def conversation(tmp_path):
+    path = tmp_path / 'ATC_000.txt'
+    path.write_text(TEXT, encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with ResultCache(str(tmp_path / 'cache.sqlite3')) as cache:
+        yield cache
+
+
+def test_unchanged_inputs_are_a_hit(cache, conversation):
+    tokenizer = make_tokenizer()
+    first = cache.score_file(tokenizer, conversation)
+
+    second = cache.score_file(tokenizer, conversation)
+
+    assert cache.stats == {'misses': 1, 'hits': 1}
+    assert dict(first) == dict(second) == dict(score_text(tokenizer, TEXT))
+
+
+def test_changed_content_is_a_miss(cache, conversation):
+    tokenizer = make_tokenizer()
+    cache.score_file(tokenizer, conversation)
+    cache.stats.clear()
+
+    with open(conversation, 'w', encoding='utf-8') as file:
+        file.write(TEXT.replace('gracias', 'terrible'))
+    results = cache.score_file(tokenizer, conversation)
+
+    assert cache.stats == {'misses': 1}
+    assert results["Positive Words"] == 0
+    assert results["Negative Words"] == 2
+
+
+def test_changed_lexicon_is_rescored(cache, conversation):
+    tokenizer = make_tokenizer()
+    cache.score_file(tokenizer, conversation)
+    cache.stats.clear()
+
+    tokenizer.set_category('problema', 'negative')
+    results = cache.score_file(tokenizer, conversation)
+
+    assert cache.stats == {'rescored': 1}
+    assert results["Negative Words"] == 2
+    assert dict(results) == dict(score_text(tokenizer, TEXT))
+    assert dict(cache.score_file(tokenizer, conversation)) == dict(results)
+    assert cache.stats == {'rescored': 1, 'hits': 1}
+
+
+@pytest.mark.parametrize('change', ['scorer', 'normalizer'])
+def test_changed_analysis_is_a_miss(cache, conversation, monkeypatch, change):
+    cache.score_file(make_tokenizer(), conversation)
+    cache.stats.clear()
+
+    if change == 'scorer':
+        monkeypatch.setattr(result_cache, 'SCORER_VERSION', result_cache.SCORER_VERSION + 1)
+        tokenizer = make_tokenizer()
+    else:
+        tokenizer = make_tokenizer(normalizer='legacy')
+    results = cache.score_file(tokenizer, conversation)
+
+    assert cache.stats == {'misses': 1}
+    assert dict(results) == dict(score_text(tokenizer, TEXT))
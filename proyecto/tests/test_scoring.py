@@ -0,0 +1,55 @@
+import glob
+import io
+import os
+
+import pytest
+
+from logic.scoring import StreamingScorer, score_stream, score_text
+from logic.tokenizer import Tokenizer
+
+PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lexicon words, criteria phrases ("muchas gracias", "número de teléfono", "¿En qué puedo ayudarle?")
+# and accented and upper-case letters, long enough to cross many chunk boundaries
+TEXT = ("¡Hola, buenos días! ¿En qué puedo ayudarle? Me da su número de teléfono, por favor.\n"
+        "El problema sigue: es TERRIBLE, pésimo. Esperando desde el 12 de marzo.\n"
+        "Muchas gracias, excelente atención. Que tenga buen día, adiós.\n")
+
+
+@pytest.fixture
+def tokenizer():
+    return Tokenizer(['gracias', 'excelente', 'favor'], ['terrible', 'pésimo', 'problema'], ['hola', 'día'])
+
+
+def example_texts():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(PROYECTO, 'ejemplos', '*.txt'))):
+        with open(path, encoding='utf-8') as file:
+            texts.append(file.read())
+    return texts
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 8, 13, 1 << 20])
+def test_score_stream_matches_score_text(tokenizer, chunk_size):
+    expected = dict(score_text(tokenizer, TEXT))
+
+    assert dict(score_stream(tokenizer, io.StringIO(TEXT), chunk_size)) == expected
+    assert expected["Performance Score"] >= 4
+    assert expected["Positive Words"] >= 3 and expected["Negative Words"] >= 3
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64])
+def test_score_stream_on_the_examples(tokenizer, chunk_size):
+    for text in example_texts():
+        assert dict(score_stream(tokenizer, io.StringIO(text), chunk_size)) == dict(score_text(tokenizer, text))
+
+
+def test_chunks_split_inside_words_and_phrases(tokenizer):
+    # Every split point of the text, fed as two chunks
+    expected = dict(score_text(tokenizer, TEXT))
+
+    for split in range(len(TEXT) + 1):
+        scorer = StreamingScorer(tokenizer)
+        scorer.feed(TEXT[:split])
+        scorer.feed(TEXT[split:])
+        assert dict(scorer.close()) == expected, split
@@ -0,0 +1,170 @@
+import http.client
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+import server
+from logic.scoring import score_text
+from logic.tokenizer import Tokenizer
+
+LEXICON = {'BUENAS': ['gracias'], 'MALAS': ['terrible'], 'NEUTRAS': ['hola']}
+
+
+@pytest.fixture
+def tokens_path(tmp_path):
+    path = tmp_path / 'tokens.json'
+    path.write_text(json.dumps(LEXICON), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def start_server():
+    # Serves a ScoringService from a thread of the test process on a free port
+    started = []
+
+    def start(tokens_path, **kwargs):
+        service = server.ScoringService(tokens_path, reload_interval=0, **kwargs)
+        http_server = server.ScoringHTTPServer(('127.0.0.1', 0), service, request_timeout=30)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        started.append(http_server)
+        return http_server
+
+    yield start
+    for http_server in started:
+        http_server.shutdown()
+        http_server.server_close()
+        http_server.service.close()
+
+
+def request(http_server, method, path, body=None):
+    connection = http.client.HTTPConnection(*http_server.server_address, timeout=30)
+    try:
+        connection.request(method, path, body=None if body is None else json.dumps(body).encode('utf-8'))
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode('utf-8'))
+    finally:
+        connection.close()
+
+
+def scores(tokens_path, text):
+    return dict(score_text(Tokenizer.from_json(tokens_path), text))
+
+
+@pytest.mark.parametrize('workers', [0, 1])
+def test_batch_request(tokens_path, start_server, workers):
+    http_server = start_server(tokens_path, workers=workers)
+    conversations = [
+        {"id": "c1", "conversation": "Hola, gracias."},
+        {"id": "c2", "conversation": ["Es terrible.", "Gracias igual."]},
+        {"conversation": ""},
+    ]
+
+    status, body = request(http_server, 'POST', '/score', {"conversations": conversations})
+
+    assert status == 200
+    assert body["results"] == [
+        dict({"id": "c1"}, **scores(tokens_path, "Hola, gracias.")),
+        dict({"id": "c2"}, **scores(tokens_path, "Es terrible.\nGracias igual.")),
+        scores(tokens_path, ""),
+    ]
+
+
+@pytest.mark.parametrize('body', [
+    {"conversation": 42},
+    {"conversation": ["Hola", None]},
+    {"conversations": [{"id": "c1"}]},
+    {"conversations": "Hola"},
+    [1, 2],
+])
+def test_invalid_input_is_refused(tokens_path, start_server, body):
+    http_server = start_server(tokens_path, workers=0)
+
+    status, response = request(http_server, 'POST', '/score', body)
+
+    assert status == 400
+    assert "error" in response
+
+
+def test_invalid_json_is_refused(tokens_path, start_server):
+    http_server = start_server(tokens_path, workers=0)
+    connection = http.client.HTTPConnection(*http_server.server_address, timeout=30)
+
+    connection.request('POST', '/score', body=b'{"conversation": ')
+    response = connection.getresponse()
+
+    assert response.status == 400
+    assert json.loads(response.read())["error"].startswith("Invalid JSON")
+    connection.close()
+
+
+@pytest.mark.parametrize('workers', [0, 1])
+def test_hot_reload(tokens_path, start_server, workers):
+    http_server = start_server(tokens_path, workers=workers)
+    _, before = request(http_server, 'POST', '/score', {"conversation": "Un problema, gracias."})
+
+    with open(tokens_path, 'w', encoding='utf-8') as file:
+        json.dump(dict(LEXICON, MALAS=['terrible', 'problema']), file)
+    status, health = request(http_server, 'POST', '/reload')
+    _, after = request(http_server, 'POST', '/score', {"conversation": "Un problema, gracias."})
+
+    assert status == 200
+    assert health["generation"] == 1
+    assert health["lexicon"] == Tokenizer.from_json(tokens_path).lexicon_fingerprint()
+    assert before["Negative Words"] == 0
+    assert after["Negative Words"] == 1
+    assert request(http_server, 'GET', '/health')[1]["generation"] == 1
+
+
+score_each = server._score_each
+
+
+def score_or_die(tokenizer, conversations):
+    # Stands in for a worker crash, e.g. a segfault or the OOM killer
+    if "die" in conversations:
+        os._exit(1)
+    return score_each(tokenizer, conversations)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="workers must inherit the patched function")
+def test_dead_worker_fails_the_request_at_once(tokens_path, start_server, monkeypatch):
+    monkeypatch.setattr(server, '_score_each', score_or_die)
+    http_server = start_server(tokens_path, workers=1, max_wait=0)
+
+    status, body = request(http_server, 'POST', '/score', {"conversation": "die"})
+    assert status == 500
+    assert "worker process died" in body["error"]
+
+    # The slot of the lost batch was released and a new pool scores the next requests
+    for _ in range(3):
+        status, body = request(http_server, 'POST', '/score', {"conversation": "Hola, gracias."})
+        assert status == 200
+        assert body == scores(tokens_path, "Hola, gracias.")
+
+
+def test_failing_conversation_fails_only_its_request(tokens_path, start_server, monkeypatch):
+    def score_or_fail(tokenizer, text):
+        if "boom" in text:
+            raise RuntimeError("boom")
+        return score_text(tokenizer, text)
+
+    monkeypatch.setattr(server, 'score_text', score_or_fail)
+    http_server = start_server(tokens_path, workers=0, max_wait=0.5)
+    service = http_server.service
+    batches = []
+    dispatch = service._dispatch
+    monkeypatch.setattr(service, '_dispatch', lambda batch: batches.append(len(batch)) or dispatch(batch))
+    texts = ["Hola, gracias.", "boom", "Es terrible."]
+
+    futures = [service.submit(text) for text in texts]
+
+    assert futures[0].result(30) == scores(tokens_path, texts[0])
+    with pytest.raises(server.ScoringError, match="boom"):
+        futures[1].result(30)
+    assert futures[2].result(30) == scores(tokens_path, texts[2])
+    assert batches == [3]
+    status, body = request(http_server, 'POST', '/score', {"conversation": "boom"})
+    assert status == 500 and body == {"error": "boom"}
+    assert request(http_server, 'POST', '/score', {"conversation": "Hola."})[0] == 200
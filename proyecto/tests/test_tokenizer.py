@@ -0,0 +1,87 @@
+import json
+import logging
+
+from logic.tokenizer import CategoryCounts, Tokenizer
+
+
+def make_tokenizer():
+    return Tokenizer(['gracias', 'excelente'], ['terrible'], ['hola'])
+
+
+def test_snapshot_is_not_changed_by_later_classifications():
+    tokenizer = make_tokenizer()
+    snapshot = tokenizer.snapshot()
+    fingerprint = snapshot.lexicon_fingerprint()
+
+    tokenizer.set_category('problema', 'negative')
+    tokenizer.set_category('hola', 'positive')
+    tokenizer.add_word('genial', 'positive')
+
+    assert snapshot.positive_words == ['gracias', 'excelente']
+    assert snapshot.negative_words == ['terrible']
+    assert snapshot.classify(snapshot.normalize_word('problema')) is None
+    assert snapshot.classify(snapshot.normalize_word('hola')) == 'neutral'
+    assert snapshot.lexicon_fingerprint() == fingerprint != tokenizer.lexicon_fingerprint()
+    assert snapshot.lexicon_fingerprint() == make_tokenizer().lexicon_fingerprint()
+
+
+def test_set_category_moves_words_that_share_the_normalized_form():
+    tokenizer = Tokenizer(['holo', 'gracias'], ['terrible'], [])
+    assert tokenizer.normalize_word('hola') == tokenizer.normalize_word('holo')
+
+    moved = tokenizer.set_category('hola', 'negative')
+
+    assert moved == ['holo']
+    assert tokenizer.positive_words == ['gracias']
+    assert tokenizer.negative_words == ['terrible', 'hola', 'holo']
+    assert tokenizer.classify(tokenizer.normalize_word('hola')) == 'negative'
+    assert tokenizer.lexicon == Tokenizer(['gracias'], ['terrible', 'hola', 'holo'], []).lexicon
+
+
+def test_set_category_does_not_duplicate_a_word():
+    tokenizer = make_tokenizer()
+    fingerprint = tokenizer.lexicon_fingerprint()
+
+    assert tokenizer.set_category('terrible', 'negative') == []
+    tokenizer.add_word('gracias', 'positive')
+
+    assert tokenizer.negative_words == ['terrible']
+    assert tokenizer.positive_words == ['gracias', 'excelente']
+    assert tokenizer.lexicon_fingerprint() == fingerprint
+
+
+def test_moved_words_survive_a_reload(tmp_path):
+    # What the GUI does: every word set_category moved is journaled, so a reloaded lexicon agrees
+    path = tmp_path / 'tokens.json'
+    path.write_text(json.dumps({'BUENAS': ['holo'], 'MALAS': [], 'NEUTRAS': []}), encoding='utf-8')
+    tokenizer = Tokenizer.from_json(str(path))
+
+    moved = tokenizer.set_category('hola', 'negative')
+    for word in ['hola'] + moved:
+        tokenizer.lexicon_store.set_category(word, 'negative')
+
+    reloaded = Tokenizer.from_json(str(path))
+    assert reloaded.classify(reloaded.normalize_word('hola')) == 'negative'
+    assert reloaded.lexicon_fingerprint() == tokenizer.lexicon_fingerprint()
+
+
+def test_conflicting_lists_are_reported(caplog):
+    # Lists journaled or edited without set_category can still give one normalized form two categories
+    with caplog.at_level(logging.WARNING, logger='proyecto'):
+        tokenizer = Tokenizer(['holo'], ['hola'], [])
+
+    assert tokenizer.classify(tokenizer.normalize_word('hola')) == 'positive'
+    assert "hola (negative; 'hol' is positive)" in caplog.text
+
+
+def test_result_objects_are_mappings():
+    tokenizer = make_tokenizer()
+
+    counts, non_defined_words = tokenizer.classify_tokens(tokenizer.tokenize("Hola, gracias, es terrible"))
+    experience = tokenizer.evaluate_experience("Hola, gracias, es terrible")
+
+    assert dict(counts) == {'positive': 1, 'negative': 1, 'neutral': 1, 'undefined': 1}
+    assert list(counts.keys()) == ['positive', 'negative', 'neutral', 'undefined']
+    assert counts == CategoryCounts(1, 1, 1, 1)
+    assert non_defined_words == {'es': tokenizer.normalize_word('es')}
+    assert dict(experience) == {'positive': 1, 'negative': 1, 'neutral': 1, 'score': 0}
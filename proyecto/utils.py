@@ -1,19 +1,44 @@
 import logging
-from tkinter import messagebox
+import os
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_LEVEL_ENV = 'TOKENIZER_LOG_LEVEL'
+
+# Importing a module never configures logging; entry points call configure_logging
+logger = logging.getLogger('proyecto')
+
 
 def read_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         return file.read()
-    
-    
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def configure_logging(level=None):
+    # Level precedence: explicit argument, then the TOKENIZER_LOG_LEVEL environment variable, then WARNING
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV, 'WARNING')
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    logging.basicConfig(format=LOG_FORMAT)
+    logger.setLevel(level)
+
+
+def log_enabled(level=logging.DEBUG):
+    # Guard for log statements whose arguments are themselves expensive to build
+    return logger.isEnabledFor(level)
+
+
+def log_message(message, *args, level=logging.DEBUG):
+    # Arguments are %-formatted lazily, only if the message is actually emitted
+    if logger.isEnabledFor(level):
+        logger.log(level, message, *args)
 
 
-def log_message(message, level=logging.DEBUG):
-    logging.log(level, message)
-    
 def handle_error(message, exception=None):
-    log_message(f"{message}: {exception}" if exception else message, level=logging.ERROR)
-    messagebox.showerror("Error", message)
\ No newline at end of file
+    if exception:
+        log_message("%s: %s", message, exception, level=logging.ERROR)
+    else:
+        log_message(message, level=logging.ERROR)
+    # Imported here so headless code using utils never loads Tk
+    from tkinter import messagebox
+    messagebox.showerror("Error", message)